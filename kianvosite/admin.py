@@ -55,10 +55,6 @@ class ProjectCategoryAdmin(admin.ModelAdmin):
     list_editable = ['order', 'is_active']
     ordering = ['order', 'name']
 
-    def project_count(self, obj):
-        return obj.projects.count()
-    project_count.short_description = 'Projects'
-
 
 # Inline for Product Screenshots
 class ProductImageInline(admin.TabularInline):
@@ -73,6 +69,7 @@ class ProductImageInline(admin.TabularInline):
 class ProjectAdmin(admin.ModelAdmin):
     inlines = [ProductImageInline]
     list_display = ['name', 'category', 'status', 'is_featured', 'is_active', 'order', 'created_at']
+    list_select_related = ['category']
     list_filter = ['status', 'category', 'is_featured', 'is_active']
     search_fields = ['name', 'tagline', 'description', 'technologies']
     prepopulated_fields = {'slug': ('name',)}
@@ -141,6 +138,7 @@ class ServiceAdmin(admin.ModelAdmin):
 @admin.register(Testimonial)
 class TestimonialAdmin(admin.ModelAdmin):
     list_display = ['client_name', 'client_company', 'rating', 'project', 'is_featured', 'is_active']
+    list_select_related = ['project']
     list_filter = ['rating', 'is_featured', 'is_active', 'project']
     search_fields = ['client_name', 'client_company', 'content']
     list_editable = ['is_featured', 'is_active']
@@ -156,16 +154,13 @@ class BlogCategoryAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
     list_editable = ['is_active']
 
-    def post_count(self, obj):
-        return obj.posts.count()
-    post_count.short_description = 'Posts'
-
 
 # Blog Post Admin
 @admin.register(BlogPost)
 class BlogPostAdmin(admin.ModelAdmin):
     form = BlogPostAdminForm
     list_display = ['title', 'category', 'author', 'is_featured', 'is_published', 'published_date', 'preview_link']
+    list_select_related = ['category']
     list_filter = ['category', 'is_featured', 'is_published', 'published_date']
     search_fields = ['title', 'excerpt']
     prepopulated_fields = {'slug': ('title',)}
@@ -304,15 +299,12 @@ class GalleryCategoryAdmin(admin.ModelAdmin):
     list_editable = ['is_active', 'order']
     ordering = ['order', 'name']
 
-    def image_count(self, obj):
-        return obj.images.count()
-    image_count.short_description = 'Images'
-
 
 # Gallery Image Admin
 @admin.register(GalleryImage)
 class GalleryImageAdmin(admin.ModelAdmin):
     list_display = ['title', 'category', 'event_date', 'is_featured', 'is_active', 'order', 'image_preview']
+    list_select_related = ['category']
     list_filter = ['category', 'is_featured', 'is_active', 'event_date']
     search_fields = ['title', 'description']
     list_editable = ['is_featured', 'is_active', 'order']
@@ -358,15 +350,12 @@ class AnnouncementAdmin(admin.ModelAdmin):
         }),
     )
 
-    def applications_count(self, obj):
-        return obj.applications.count()
-    applications_count.short_description = 'Apps'
-
 
 # Announcement Application Admin
 @admin.register(AnnouncementApplication)
 class AnnouncementApplicationAdmin(admin.ModelAdmin):
     list_display = ['full_name', 'email', 'phone', 'announcement', 'status', 'applied_at']
+    list_select_related = ['announcement']
     list_filter = ['status', 'announcement']
     search_fields = ['full_name', 'email', 'phone']
     list_editable = ['status']
@@ -415,6 +404,7 @@ class HeroSlideAdmin(admin.ModelAdmin):
 @admin.register(ActiveProduct)
 class ActiveProductAdmin(admin.ModelAdmin):
     list_display = ['name', 'category', 'project_link', 'is_featured', 'is_active', 'order']
+    list_select_related = ['project']
     list_filter = ['category', 'is_featured', 'is_active']
     search_fields = ['name', 'short_description']
     list_editable = ['is_featured', 'is_active', 'order']
@@ -423,7 +413,6 @@ class ActiveProductAdmin(admin.ModelAdmin):
     def project_link(self, obj):
         if obj.project:
             url = f'/portfolio/{obj.project.slug}/'
-            from django.utils.html import format_html
             return format_html('<a href="{}" target="_blank">{}</a>', url, obj.project.name)
         return '—'
     project_link.short_description = 'Linked Project'
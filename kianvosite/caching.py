@@ -0,0 +1,201 @@
+"""
+Versioned caching helpers.
+
+Every cached value is keyed on the current "version" of the models it was
+built from. Saving or deleting a row bumps the version of its model (see
+signals.py), so stale entries are simply never read again and age out of the
+cache on their own. Whole pages for anonymous visitors work the same way,
+keyed on a generation per URL section instead of per model, and on the
+deployed release so a deploy never serves markup rendered by old code.
+"""
+import hashlib
+import os
+import time
+from datetime import datetime, timezone
+from functools import lru_cache, partial, wraps
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.views.decorators.http import condition
+
+SECTION_TIMEOUT = 60 * 60 * 24
+PAGE_TIMEOUT = 60 * 60 * 24
+
+
+def _version_key(model):
+    return f'kv:version:{model._meta.label_lower}'
+
+
+def _fresh_version():
+    # A nanosecond timestamp rather than a counter, so a version key that was
+    # evicted never comes back with a value an old entry was keyed on.
+    return time.time_ns()
+
+
+def _get_stamps(keys):
+    found = cache.get_many(keys)
+    missing = {key: _fresh_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return found
+
+
+def get_versions(models):
+    """Return {model: version} for the given models, initialising missing keys."""
+    keys = {_version_key(m): m for m in models}
+    found = _get_stamps(keys)
+    return {model: found[key] for key, model in keys.items()}
+
+
+def bump_version(model):
+    """Invalidate everything cached against ``model``."""
+    cache.set(_version_key(model), _fresh_version(), None)
+
+
+def cached_sections(prefix, sections, timeout=SECTION_TIMEOUT):
+    """
+    Build a context dict from ``sections``, a mapping of
+    name -> (models, builder). Each builder's result is cached under the
+    versions of its models, so only the sections whose models changed are
+    rebuilt. Builders must return fully evaluated values (lists, not
+    querysets). A warm call costs two cache round trips and no queries.
+    """
+    versions = get_versions({m for models, _ in sections.values() for m in models})
+    keys = {}
+    for name, (models, _) in sections.items():
+        # Hashed: a section over many models would outgrow memcached's
+        # 250-character key limit
+        stamp = '.'.join(str(versions[m]) for m in models)
+        keys[f'kv:section:{prefix}:{name}:' + hashlib.md5(stamp.encode()).hexdigest()] = name
+
+    hits = cache.get_many(keys)
+    context, misses = {}, {}
+    for key, name in keys.items():
+        if key in hits:
+            context[name] = hits[key]
+        else:
+            context[name] = misses[key] = sections[name][1]()
+    if misses:
+        cache.set_many(misses, timeout)
+    return context
+
+
+def cached_section(prefix, name, models, builder, timeout=SECTION_TIMEOUT):
+    """Single-value form of cached_sections()."""
+    return cached_sections(prefix, {name: (models, builder)}, timeout)[name]
+
+
+# ---------------------------------------------------------------------------
+#  Full-page cache
+# ---------------------------------------------------------------------------
+
+ALL_PAGES = '*'
+
+
+def page_section(path):
+    """'/blog/some-post/' -> '/blog/'. Detail pages share their list's section."""
+    segment = path.strip('/').split('/', 1)[0]
+    return f'/{segment}/' if segment else '/'
+
+
+def _generation_key(section):
+    return f'kv:pagegen:{section}'
+
+
+def purge_pages(*sections):
+    """Drop every cached page under the given sections ('/blog/', '/', or ALL_PAGES)."""
+    cache.set_many({_generation_key(s): _fresh_version() for s in sections}, None)
+
+
+@lru_cache(maxsize=None)
+def release():
+    """
+    (token, time in ns) for the deployed code. The token is settings.RELEASE
+    when the deploy sets one; the time, and otherwise the token, come from
+    the newest template, app source or collected static manifest file, so
+    they are the same in every worker and move with each deploy.
+    """
+    roots = [Path(d) for engine in settings.TEMPLATES for d in engine['DIRS']] + [Path(__file__).parent]
+    files = [Path(settings.STATIC_ROOT) / 'staticfiles.json'] if settings.STATIC_ROOT else []
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if d != '__pycache__']
+            files += [Path(dirpath) / name for name in filenames]
+    newest = max((f.stat().st_mtime_ns for f in files if f.exists()), default=0)
+    token = hashlib.md5((settings.RELEASE or str(newest)).encode()).hexdigest()[:12]
+    return token, newest
+
+
+def _is_cacheable(request):
+    return (request.method in ('GET', 'HEAD')
+            and not request.user.is_authenticated
+            and not len(messages.get_messages(request)))
+
+
+def _page_stamps(request):
+    """Generations of ALL_PAGES and the request's section, memoised on the request."""
+    stamps = getattr(request, '_page_stamps', None)
+    if stamps is None:
+        keys = [_generation_key(ALL_PAGES), _generation_key(page_section(request.path))]
+        found = _get_stamps(keys)
+        stamps = request._page_stamps = [found[k] for k in keys]
+    return stamps
+
+
+def cache_anonymous_page(view=None, *, params=()):
+    """
+    Serve ``view`` from the cache for anonymous GET/HEAD requests.
+
+    Responses are keyed on the release, the path, the query parameters the
+    view reads (``params``; any others are ignored, so junk query strings
+    share the page's entry) and the generations of ALL_PAGES and the page's
+    section, which signals.py bumps when a model shown on those pages
+    changes. Authenticated users, POSTs and requests with pending flash
+    messages always reach the view, and only plain 200 responses that set no
+    cookies are stored.
+    """
+    if view is None:
+        return partial(cache_anonymous_page, params=params)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _is_cacheable(request):
+            return view(request, *args, **kwargs)
+
+        query = [f'{p}={v}' for p in sorted(params) for v in request.GET.getlist(p)]
+        raw = '|'.join([release()[0]] + [str(s) for s in _page_stamps(request)] + [request.path] + query)
+        key = 'kv:page:' + hashlib.md5(raw.encode()).hexdigest()
+
+        cached = cache.get(key)
+        if cached is not None:
+            content, headers = cached
+            return HttpResponse(content, headers=headers)
+
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming and not response.cookies:
+            cache.set(key, (response.content, dict(response.items())), PAGE_TIMEOUT)
+        return response
+    return wrapper
+
+
+def _page_etag(request, *args, **kwargs):
+    if _is_cacheable(request):
+        return '-'.join([release()[0]] + [str(s) for s in _page_stamps(request)])
+
+
+def _page_last_modified(request, *args, **kwargs):
+    if _is_cacheable(request):
+        return datetime.fromtimestamp(max(*_page_stamps(request), release()[1]) / 1e9, tz=timezone.utc)
+
+
+# Answer 304 Not Modified from the release and page generations alone,
+# before the view (or the page cache) runs. A generation is the time of the
+# last write to any model shown in that section, so it moves exactly when the
+# rows' updated_at does, and also covers models without updated_at and the
+# related/footer content a single row's timestamp would miss. The release
+# moves both validators on every deploy.
+conditional_page = condition(etag_func=_page_etag, last_modified_func=_page_last_modified)
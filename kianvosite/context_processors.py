@@ -1,13 +1,32 @@
 from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+from .caching import cached_section
 from .models import Announcement, SocialLink
 
 
+def _open_announcements():
+    return cached_section('global', 'open_announcements', (Announcement,), lambda: list(
+        Announcement.objects.filter(is_active=True, status='open')[:5]
+    ))
+
+
+def _social_links():
+    return cached_section('global', 'social_links', (SocialLink,), lambda: list(
+        SocialLink.objects.filter(is_active=True)
+    ))
+
+
 def global_context(request):
+    # Lazy so templates that never touch these pay nothing; memoised on the
+    # request so several renders in one request share a single cache lookup.
+    lazy = getattr(request, '_global_context', None)
+    if lazy is None:
+        lazy = request._global_context = {
+            'open_announcements': SimpleLazyObject(_open_announcements),
+            'social_links': SimpleLazyObject(_social_links),
+        }
     return {
-        'open_announcements': Announcement.objects.filter(
-            is_active=True, status='open'
-        )[:5],
-        'social_links': SocialLink.objects.filter(is_active=True),
+        **lazy,
         'SITE_URL': settings.SITE_URL,
         'GOOGLE_ANALYTICS_ID': settings.GOOGLE_ANALYTICS_ID,
     }
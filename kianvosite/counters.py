@@ -0,0 +1,53 @@
+"""
+Denormalised child counts: ProjectCategory.project_count,
+BlogCategory.post_count, GalleryCategory.image_count and
+Announcement.applications_count.
+
+Signals (see signals.py) adjust them with F() updates on every save and
+delete, so concurrent writes cannot lose an increment. QuerySet.update() and
+bulk deletes skip signals; `manage.py recount` repairs any drift.
+"""
+from django.apps import apps
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+# child model -> [(foreign key, counter field on the parent)]
+COUNTERS = {
+    'Project': [('category', 'project_count')],
+    'BlogPost': [('category', 'post_count')],
+    'GalleryImage': [('category', 'image_count')],
+    'AnnouncementApplication': [('announcement', 'applications_count')],
+}
+
+
+def counted_fields(model):
+    """(ForeignKey, counter name) pairs for ``model``, or [] if it is not counted."""
+    if model._meta.app_label != 'kianvosite':
+        return []
+    return [(model._meta.get_field(fk), counter) for fk, counter in COUNTERS.get(model.__name__, [])]
+
+
+def adjust(field, counter, pk, delta):
+    """
+    Add ``delta`` to the counter on the parent row ``pk`` of foreign key
+    ``field``, stopping at 0 so a counter that has drifted low cannot break a
+    delete.
+    """
+    if pk is not None:
+        field.related_model.objects.filter(pk=pk).update(**{counter: Greatest(F(counter) + delta, 0)})
+
+
+def recount():
+    """Recompute every counter from scratch; returns {counter: rows corrected}."""
+    corrected = {}
+    for model_name, counters in COUNTERS.items():
+        child = apps.get_model('kianvosite', model_name)
+        for fk, counter in counters:
+            field = child._meta.get_field(fk)
+            actual = Coalesce(Subquery(
+                child.objects.filter(**{fk: OuterRef('pk')}).order_by()
+                .values(fk).annotate(n=Count('pk')).values('n')
+            ), 0)
+            drifted = field.related_model.objects.annotate(actual=actual).exclude(**{counter: F('actual')})
+            corrected[counter] = drifted.update(**{counter: actual})
+    return corrected
@@ -0,0 +1,241 @@
+"""
+Responsive image derivatives.
+
+For every uploaded image we store resized copies next to the original, in
+WebP and in the original format:
+
+    projects/screenshots/dashboard.png
+    projects/screenshots/dashboard.3fa2c9e1d0b4.640w.webp
+    projects/screenshots/dashboard.3fa2c9e1d0b4.640w.png
+
+The content hash in the name means a derivative's bytes never change under
+a given URL, so it can be cached forever. The {% responsive_image %} tag in
+media_tags turns the recorded widths into srcset/sizes attributes.
+
+Saving a model only queues a MediaJob; `manage.py process_media_jobs` does
+the Pillow work in a process pool, off the request path.
+"""
+import hashlib
+import io
+import logging
+import os
+import posixpath
+import tempfile
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import models as db_models
+from django.utils import timezone
+from PIL import ExifTags, Image, ImageCms, ImageOps
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_WIDTHS = (320, 640, 1024, 1600)
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+
+def image_fields(model):
+    return [f.name for f in model._meta.fields if isinstance(f, db_models.ImageField)]
+
+
+def derivative_name(source, digest, width, ext):
+    stem, _ = posixpath.splitext(source)
+    return f'{stem}.{digest}.{width}w.{ext}'
+
+
+def derivative_cache_key(source):
+    """Cache key for the (digest, width, widths) of ``source``; signals.py clears it when they change."""
+    return 'kv:derivative:' + hashlib.md5(source.encode()).hexdigest()
+
+
+def derivatives_for(sources):
+    """
+    {source: (digest, width, widths) or None} for ``sources``, None until a
+    source has been processed: one cache round trip, then one query for the
+    sources the cache did not have.
+    """
+    from .caching import SECTION_TIMEOUT
+    from .models import ImageDerivative
+
+    keys = {derivative_cache_key(source): source for source in set(sources)}
+    found = {keys[key]: entry for key, entry in cache.get_many(keys).items()}
+    missing = set(keys.values()) - found.keys()
+    if missing:
+        rows = {
+            source: (digest, width, widths) for source, digest, width, widths in
+            ImageDerivative.objects.filter(source__in=missing).values_list('source', 'digest', 'width', 'widths')
+        }
+        # () marks "no derivatives yet", so misses are cached too
+        fresh = {source: rows.get(source, ()) for source in missing}
+        cache.set_many({derivative_cache_key(source): entry for source, entry in fresh.items()}, SECTION_TIMEOUT)
+        found.update(fresh)
+    return {source: tuple(entry) or None for source, entry in found.items()}
+
+
+def prefetch_derivatives(request, images):
+    """
+    Resolve the derivatives of ``images`` (ImageField values) in one go for
+    the {% responsive_image %} tags on ``request``'s page. Views call this
+    with every image the template will render. Returns {source: entry}.
+    """
+    found = getattr(request, '_image_derivatives', None)
+    if found is None:
+        found = request._image_derivatives = {}
+    found.update(derivatives_for({image.name for image in images if image} - found.keys()))
+    return found
+
+
+def srcsets(image, entry):
+    """(WebP srcset, original-format srcset) for ``image`` from its derivatives ``entry``."""
+    digest, width, widths = entry
+    ext = image.name.rsplit('.', 1)[-1].lower()
+
+    def url(w, e):
+        return default_storage.url(derivative_name(image.name, digest, w, e))
+
+    webp = ', '.join([f'{url(w, "webp")} {w}w' for w in widths] + [f'{url(width, "webp")} {width}w'])
+    original = ', '.join([f'{url(w, ext)} {w}w' for w in widths] + [f'{image.url} {width}w'])
+    return webp, original
+
+
+def _encode(image, fmt):
+    buf = io.BytesIO()
+    if fmt == 'WEBP':
+        image.save(buf, 'WEBP', quality=WEBP_QUALITY, method=4)
+    elif fmt == 'JPEG':
+        image.convert('RGB').save(buf, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(buf, fmt, optimize=True)
+    return buf.getvalue()
+
+
+def _store(name, data):
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(data))
+
+
+def _to_srgb(image, icc):
+    """``image`` converted from its embedded ``icc`` profile to sRGB, so dropping the profile keeps its colours."""
+    try:
+        return ImageCms.profileToProfile(
+            image, ImageCms.ImageCmsProfile(io.BytesIO(icc)), ImageCms.createProfile('sRGB'),
+            outputMode='RGBA' if image.mode == 'RGBA' else 'RGB',
+        )
+    except (ImageCms.PyCMSError, OSError, ValueError) as e:
+        logger.warning(f'Cannot convert ICC profile, keeping pixels as they are: {e}')
+        return image
+
+
+def _strip_metadata(source, raw, original, image):
+    """
+    Rewrite the original without EXIF/XMP (camera details, GPS) or an ICC
+    profile, once any orientation tag has been applied to the pixels.
+    Returns the file's bytes and the image to build derivatives from.
+
+    Files with nothing to strip, and animated images (re-encoding would keep
+    only the first frame), are left alone. A JPEG that needed no rotation or
+    colour conversion keeps its quantisation tables, so it loses no quality.
+    The new file is written beside the old one and moved over it, so readers
+    never see it half-written.
+    """
+    icc = original.info.get('icc_profile')
+    if not ({'exif', 'xmp'} & set(original.info) or icc) or getattr(original, 'is_animated', False):
+        return raw, image
+    if icc:
+        image = _to_srgb(image, icc)
+        # PNG and WebP writers copy a profile from image.info
+        image.info.pop('icc_profile', None)
+
+    rotated = original.getexif().get(ExifTags.Base.Orientation, 1) != 1
+    if original.format == 'JPEG' and not rotated and not icc:
+        buf = io.BytesIO()
+        original.save(buf, 'JPEG', quality='keep', subsampling='keep', optimize=True)
+        data = buf.getvalue()
+    else:
+        data = _encode(image, original.format)
+
+    path = default_storage.path(source)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.strip-')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        os.chmod(tmp, os.stat(path).st_mode & 0o777)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return data, image
+
+
+def build_derivatives(source):
+    """
+    Do the file work for ``source``: strip its metadata, then write the
+    resized WebP and original-format copies. Touches storage only, never the
+    database, so it can run in a worker process. Returns the values for
+    ImageDerivative; raises if the file is missing or unreadable.
+    """
+    with default_storage.open(source, 'rb') as fh:
+        raw = fh.read()
+    original = Image.open(io.BytesIO(raw))
+    fmt = original.format
+    image = ImageOps.exif_transpose(original)
+    raw, image = _strip_metadata(source, raw, original, image)
+
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+    digest = hashlib.sha256(raw).hexdigest()[:12]
+    ext = posixpath.splitext(source)[1].lstrip('.').lower() or 'png'
+    widths = [w for w in DERIVATIVE_WIDTHS if w < image.width]
+    for width in widths:
+        resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        _store(derivative_name(source, digest, width, 'webp'), _encode(resized, 'WEBP'))
+        _store(derivative_name(source, digest, width, ext), _encode(resized, fmt))
+    # Full-size WebP: often a fraction of a PNG screenshot at the same width
+    _store(derivative_name(source, digest, image.width, 'webp'), _encode(image, 'WEBP'))
+    return {'digest': digest, 'width': image.width, 'widths': widths}
+
+
+def record_derivatives(source, result):
+    from .models import ImageDerivative
+
+    derivative, _ = ImageDerivative.objects.update_or_create(source=source, defaults=result)
+    return derivative
+
+
+def generate_derivatives(source):
+    """
+    Build and record derivatives for ``source`` in-process. Returns the
+    ImageDerivative, or None if the file is missing or not an image Pillow
+    can read.
+    """
+    try:
+        result = build_derivatives(source)
+    except Exception as e:
+        logger.warning(f'Cannot build derivatives for "{source}": {e}')
+        return None
+    return record_derivatives(source, result)
+
+
+def missing_sources(instance):
+    """Storage names of ``instance``'s images that have no derivatives yet."""
+    from .models import ImageDerivative
+
+    names = {getattr(instance, f).name for f in image_fields(type(instance))} - {'', None}
+    if not names:
+        return []
+    done = set(ImageDerivative.objects.filter(source__in=names).values_list('source', flat=True))
+    return sorted(names - done)
+
+
+def enqueue(source):
+    """Queue ``source`` for processing; a failed job is given a fresh start."""
+    from .models import MediaJob
+
+    job, created = MediaJob.objects.get_or_create(source=source)
+    if not created and job.status == 'failed':
+        MediaJob.objects.filter(pk=job.pk).update(
+            status='pending', attempts=0, last_error='', run_after=timezone.now(), updated_at=timezone.now(),
+        )
@@ -0,0 +1,50 @@
+"""
+Helpers shared by the database-backed work queues (MediaJob, EmailOutbox).
+
+A job row is 'pending' until a worker claims it ('running'). It then ends
+'done', or goes back to 'pending' with a later run_after after an error, and
+ends 'failed' once it has used up its attempts. Claiming is an UPDATE guarded
+on the status, so several workers can drain one queue safely.
+"""
+from datetime import timedelta
+
+from django.db.models import F
+from django.utils import timezone
+
+
+def requeue_stale(model, after):
+    """Put back jobs left 'running' for longer than ``after`` by a worker that died."""
+    now = timezone.now()
+    return model.objects.filter(status='running', updated_at__lt=now - after).update(status='pending', updated_at=now)
+
+
+def claim(model, batch):
+    """Mark up to ``batch`` due jobs as running and return them."""
+    now = timezone.now()
+    ids = model.objects.filter(status='pending', run_after__lte=now).values_list('pk', flat=True)[:batch]
+    claimed = [
+        pk for pk in ids
+        if model.objects.filter(pk=pk, status='pending').update(
+            status='running', attempts=F('attempts') + 1, updated_at=now,
+        )
+    ]
+    return list(model.objects.filter(pk__in=claimed))
+
+
+def mark_done(job, **fields):
+    type(job).objects.filter(pk=job.pk).update(status='done', last_error='', updated_at=timezone.now(), **fields)
+
+
+def retry_or_fail(job, error, max_attempts, base_minutes):
+    """
+    Schedule another attempt with exponential backoff (base, 2x base, 4x
+    base, ...), or mark the job failed. Returns the delay, or None if failed.
+    """
+    now = timezone.now()
+    queryset = type(job).objects.filter(pk=job.pk)
+    if job.attempts >= max_attempts:
+        queryset.update(status='failed', last_error=str(error), updated_at=now)
+        return None
+    delay = timedelta(minutes=base_minutes * 2 ** (job.attempts - 1))
+    queryset.update(status='pending', last_error=str(error), run_after=now + delay, updated_at=now)
+    return delay
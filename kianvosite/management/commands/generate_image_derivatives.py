@@ -0,0 +1,21 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from kianvosite.images import image_fields, missing_sources, enqueue
+
+
+class Command(BaseCommand):
+    help = 'Queue responsive derivatives for uploaded images that do not have them yet (then run process_media_jobs)'
+
+    def handle(self, *args, **options):
+        queued = 0
+        for model in apps.get_app_config('kianvosite').get_models():
+            fields = image_fields(model)
+            if not fields:
+                continue
+            for obj in model.objects.only('pk', *fields):
+                for source in missing_sources(obj):
+                    enqueue(source)
+                    queued += 1
+                    self.stdout.write(f'   [QUEUED] {source}')
+
+        self.stdout.write(self.style.SUCCESS(f'Queued {queued} images. Run: python manage.py process_media_jobs'))
@@ -0,0 +1,55 @@
+import mailbox
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import Lower
+from kianvosite.caching import bump_version
+from kianvosite.models import NewsletterSubscriber
+from kianvosite.newsletter import bounced_addresses
+
+
+class Command(BaseCommand):
+    help = (
+        'Read bounce reports from a maildir and deactivate newsletter subscribers whose '
+        'address failed permanently. Processed messages are marked as seen, not deleted.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--maildir', default=settings.BOUNCE_MAILDIR, help='Maildir to read (default: BOUNCE_MAILDIR)')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be deactivated without changing anything')
+
+    def handle(self, *args, **options):
+        path = options['maildir']
+        if not path or not os.path.isdir(path):
+            raise CommandError('Set BOUNCE_MAILDIR (DJANGO_BOUNCE_MAILDIR) or pass --maildir to an existing maildir.')
+
+        box = mailbox.Maildir(path, create=False)
+        bounced = set()
+        read = 0
+        for key, message in box.iteritems():
+            if 'S' in message.get_flags():
+                continue
+            read += 1
+            bounced |= bounced_addresses(message)
+            if not options['dry_run']:
+                message.set_subdir('cur')
+                message.add_flag('S')
+                box[key] = message
+
+        subscribers = (
+            NewsletterSubscriber.objects.annotate(email_lower=Lower('email'))
+            .filter(email_lower__in=bounced, is_active=True)
+        )
+        for email in subscribers.values_list('email', flat=True):
+            self.stdout.write(f'   [BOUNCED] {email}')
+        if options['dry_run']:
+            count = subscribers.count()
+        else:
+            count = subscribers.update(is_active=False)
+            # update() sends no post_save, so invalidate the subscriber counts by hand
+            bump_version(NewsletterSubscriber)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Read {read} new messages; {len(bounced)} bounced addresses; {count} subscribers deactivated'
+        ))
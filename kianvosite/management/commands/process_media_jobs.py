@@ -0,0 +1,76 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+
+import django
+from django.core.management.base import BaseCommand
+from kianvosite.caching import purge_pages
+from kianvosite.images import build_derivatives, record_derivatives
+from kianvosite.jobs import requeue_stale, claim, mark_done, retry_or_fail
+from kianvosite.models import MediaJob
+from kianvosite.signals import pages_showing
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_MINUTES = 1
+# A job still "running" after this long belongs to a worker that died
+STALE_AFTER = timedelta(minutes=30)
+
+
+def _init_worker():
+    # Needed where workers are spawned rather than forked (Windows, macOS)
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = (
+        'Resize, strip EXIF from and re-encode queued image uploads in a process pool. '
+        'Run from cron, or keep it running with --loop.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+        parser.add_argument('--batch', type=int, default=20, help='Jobs claimed per round')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new jobs instead of exiting when idle')
+        parser.add_argument('--sleep', type=float, default=5, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        reclaimed = requeue_stale(MediaJob, STALE_AFTER)
+        if reclaimed:
+            self.stdout.write(self.style.WARNING(f'Re-queued {reclaimed} stale jobs'))
+
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+            while True:
+                jobs = claim(MediaJob, options['batch'])
+                if not jobs:
+                    if not options['loop']:
+                        break
+                    time.sleep(options['sleep'])
+                    continue
+
+                futures = {pool.submit(build_derivatives, job.source): job for job in jobs}
+                finished = []
+                for future in as_completed(futures):
+                    job = futures[future]
+                    try:
+                        record_derivatives(job.source, future.result())
+                    except Exception as e:
+                        failed += 1
+                        self._fail(job, e)
+                    else:
+                        done += 1
+                        mark_done(job)
+                        finished.append(job.source)
+                        self.stdout.write(f'   [OK] {job.source}')
+                # One purge for the batch, of only the pages that show its images
+                if finished:
+                    purge_pages(*pages_showing(finished))
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {done} images ({failed} failed)'))
+
+    def _fail(self, job, error):
+        delay = retry_or_fail(job, error, MAX_ATTEMPTS, RETRY_BASE_MINUTES)
+        if delay is None:
+            self.stdout.write(self.style.ERROR(f'   [FAIL] {job.source}: {error}'))
+        else:
+            self.stdout.write(self.style.WARNING(f'   [RETRY] {job.source} in {delay}: {error}'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from kianvosite import portal_search, site_search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search indexes from the database'
+
+    def handle(self, *args, **options):
+        if not portal_search.enabled():
+            self.stdout.write(self.style.WARNING('Search uses icontains on this database; nothing to build'))
+            return
+        for model in portal_search.search_fields():
+            portal_search.rebuild(model)
+            self.stdout.write(f'   [OK] {model._meta.label}')
+        self.stdout.write(f'   [OK] Site search: {site_search.rebuild()} documents')
+        self.stdout.write(self.style.SUCCESS('Search indexes rebuilt'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from kianvosite.counters import recount
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalised category and announcement counters from the database'
+
+    def handle(self, *args, **options):
+        for counter, corrected in recount().items():
+            if corrected:
+                self.stdout.write(self.style.WARNING(f'   [FIXED] {counter}: {corrected} rows'))
+            else:
+                self.stdout.write(f'   [OK] {counter}')
+        self.stdout.write(self.style.SUCCESS('Counters are up to date'))
@@ -0,0 +1,80 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from django.utils import timezone
+from kianvosite.jobs import requeue_stale, claim, mark_done, retry_or_fail
+from kianvosite.models import Broadcast, DeliveryAttempt
+from kianvosite.newsletter import Throttle, send_batch, subscriber_batches
+from kianvosite.utils import blog_newsletter, announcement_newsletter
+
+MAX_ATTEMPTS = 3
+RETRY_BASE_MINUTES = 5
+# Progress is saved after every batch, so a broadcast this quiet has lost its worker
+STALE_AFTER = timedelta(minutes=15)
+
+
+class Command(BaseCommand):
+    help = (
+        'Send queued newsletter broadcasts to all active subscribers, saving progress after each batch. '
+        'Run from cron, or keep it running with --loop.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new broadcasts instead of exiting when idle')
+        parser.add_argument('--sleep', type=float, default=10, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        reclaimed = requeue_stale(Broadcast, STALE_AFTER)
+        if reclaimed:
+            self.stdout.write(self.style.WARNING(f'Resuming {reclaimed} interrupted broadcasts'))
+
+        while True:
+            broadcasts = claim(Broadcast, 1)
+            if not broadcasts:
+                if not options['loop']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            broadcast = broadcasts[0]
+            try:
+                self._send(broadcast)
+            except Exception as e:
+                delay = retry_or_fail(broadcast, e, MAX_ATTEMPTS, RETRY_BASE_MINUTES)
+                if delay is None:
+                    self.stdout.write(self.style.ERROR(f'   [FAIL] {broadcast.title}: {e}'))
+                else:
+                    self.stdout.write(self.style.WARNING(f'   [RETRY] {broadcast.title} in {delay}: {e}'))
+
+    def _send(self, broadcast):
+        if broadcast.blog_post_id:
+            campaign = blog_newsletter(broadcast.blog_post)
+        else:
+            campaign = announcement_newsletter(broadcast.announcement)
+
+        throttle = Throttle(settings.NEWSLETTER_RATE)
+        # Resumes after the last subscriber handled if a previous run was interrupted
+        for batch in subscriber_batches(after=broadcast.last_subscriber_id):
+            deliveries = send_batch(campaign, [email for _, email in batch], throttle)
+            DeliveryAttempt.objects.bulk_create([
+                DeliveryAttempt(
+                    broadcast=broadcast, subscriber_id=pk, email=d.email, ok=d.ok, smtp_code=d.code,
+                    error=d.error, latency_ms=d.latency_ms, retries=d.retries,
+                )
+                for (pk, _), d in zip(batch, deliveries)
+            ])
+            sent = sum(d.ok for d in deliveries)
+            failed = len(deliveries) - sent
+            Broadcast.objects.filter(pk=broadcast.pk).update(
+                sent=F('sent') + sent, failed=F('failed') + failed,
+                last_subscriber_id=batch[-1][0], updated_at=timezone.now(),
+            )
+
+        mark_done(broadcast, total=F('sent') + F('failed'))
+        broadcast.refresh_from_db()
+        self.stdout.write(self.style.SUCCESS(
+            f'[OK] {broadcast.title}: {broadcast.sent} sent, {broadcast.failed} failed'
+        ))
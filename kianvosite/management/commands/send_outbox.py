@@ -0,0 +1,73 @@
+import time
+from datetime import timedelta
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from kianvosite.jobs import requeue_stale, claim, mark_done, retry_or_fail
+from kianvosite.models import EmailOutbox
+from kianvosite.utils import deliver_email
+
+MAX_ATTEMPTS = 6
+RETRY_BASE_MINUTES = 1
+# A message still "sending" after this long belongs to a worker that died
+STALE_AFTER = timedelta(minutes=15)
+
+
+class Command(BaseCommand):
+    help = (
+        'Send queued emails from the outbox, retrying failures with exponential backoff. '
+        'Run from cron, or keep it running with --loop.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=50, help='Messages sent per SMTP connection')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new mail instead of exiting when idle')
+        parser.add_argument('--sleep', type=float, default=5, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        reclaimed = requeue_stale(EmailOutbox, STALE_AFTER)
+        if reclaimed:
+            self.stdout.write(self.style.WARNING(f'Re-queued {reclaimed} stale messages'))
+
+        sent = failed = 0
+        while True:
+            messages = claim(EmailOutbox, options['batch'])
+            if not messages:
+                if not options['loop']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            connection = get_connection()
+            try:
+                connection.open()
+            except Exception as e:
+                # Server unreachable: every message in the batch waits and retries
+                for message in messages:
+                    self._fail(message, e)
+                failed += len(messages)
+                continue
+
+            try:
+                for message in messages:
+                    try:
+                        deliver_email(message, connection=connection)
+                    except Exception as e:
+                        failed += 1
+                        self._fail(message, e)
+                    else:
+                        sent += 1
+                        mark_done(message, sent_at=timezone.now())
+                        self.stdout.write(f'   [OK] {message.subject} -> {", ".join(message.to)}')
+            finally:
+                connection.close()
+
+        self.stdout.write(self.style.SUCCESS(f'Sent {sent} emails ({failed} failed)'))
+
+    def _fail(self, message, error):
+        delay = retry_or_fail(message, error, MAX_ATTEMPTS, RETRY_BASE_MINUTES)
+        if delay is None:
+            self.stdout.write(self.style.ERROR(f'   [FAIL] {message.subject}: {error}'))
+        else:
+            self.stdout.write(self.style.WARNING(f'   [RETRY] {message.subject} in {delay}: {error}'))
@@ -0,0 +1,48 @@
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from kianvosite.caching import purge_pages, ALL_PAGES
+from kianvosite.sitemaps import sitemaps, StaticViewSitemap
+
+
+class Command(BaseCommand):
+    help = 'Pre-render public pages so the first visitor after a deploy hits a warm cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Also warm every detail page listed in the sitemaps (projects, services, blog, announcements)',
+        )
+
+    def handle(self, *args, **options):
+        site = urlparse(settings.SITE_URL)
+        client = Client(HTTP_HOST=site.netloc, secure=site.scheme == 'https', raise_request_exception=False)
+
+        static = StaticViewSitemap()
+        urls = [static.location(item) for item in static.items()]
+        if options['all']:
+            for name, sitemap_class in sitemaps.items():
+                if sitemap_class is StaticViewSitemap:
+                    continue
+                sitemap = sitemap_class()
+                urls += [sitemap.location(obj) for obj in sitemap.items()]
+
+        # Pages cached before the deploy may hold markup from the old templates
+        purge_pages(ALL_PAGES)
+        self.stdout.write(f'Warming {len(urls)} pages...')
+        failed = 0
+        for url in urls:
+            response = client.get(url)
+            if response.status_code == 200:
+                self.stdout.write(f'   [OK] {url}')
+            else:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'   [{response.status_code}] {url}'))
+
+        if failed:
+            self.stdout.write(self.style.WARNING(f'Warmed {len(urls) - failed} pages, {failed} failed'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Warmed {len(urls)} pages'))
@@ -0,0 +1,134 @@
+"""
+Serving for /media/ uploads.
+
+With MEDIA_SENDFILE set, the front server sends the bytes (X-Sendfile or
+X-Accel-Redirect) and the Passenger worker only checks the path and writes
+headers. Otherwise the file is streamed with FileResponse, honouring single
+byte ranges (video seeking, resumed downloads) and conditional GETs.
+
+Derivative names carry a content hash (see images.derivative_name), so their
+bytes never change under a URL and browsers may cache them for good.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+# stem.<12 hex digest>.<width>w.<ext>
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.\d+w\.[a-z0-9]+$')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class _RangeFile:
+    """Read at most ``length`` bytes of ``fh`` starting at ``start``."""
+
+    def __init__(self, fh, start, length):
+        fh.seek(start)
+        self.fh = fh
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fh.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.fh.close()
+
+
+def _byte_range(request, size, etag, last_modified):
+    """
+    The (start, end) of a satisfiable single ``Range`` header, None to send the
+    whole file, or False when the range is unsatisfiable. Multi-range requests
+    and stale If-Range validators get the whole file.
+    """
+    header = request.META.get('HTTP_RANGE', '')
+    match = RANGE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != int(last_modified):
+        return None
+
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _sendfile_response(path, fullpath):
+    response = HttpResponse()
+    if settings.MEDIA_SENDFILE == 'X-Accel-Redirect':
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + quote(path)
+    else:
+        response[settings.MEDIA_SENDFILE] = fullpath
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Media file not found')
+    try:
+        stat = os.stat(fullpath)
+    except OSError:
+        raise Http404('Media file not found')
+    if not os.path.isfile(fullpath):
+        raise Http404('Media file not found')
+
+    etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = content_type or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        if settings.MEDIA_SENDFILE:
+            response = _sendfile_response(path, fullpath)
+        else:
+            byte_range = _byte_range(request, stat.st_size, etag, stat.st_mtime)
+            if byte_range is False:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{stat.st_size}'
+                return response
+            if byte_range is None:
+                response = FileResponse(open(fullpath, 'rb'))
+            else:
+                start, end = byte_range
+                length = end - start + 1
+                response = FileResponse(_RangeFile(open(fullpath, 'rb'), start, length), status=206)
+                response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+                response['Content-Length'] = length
+            response['Accept-Ranges'] = 'bytes'
+        response['Content-Type'] = content_type
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if HASHED_NAME.search(path):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=settings.MEDIA_MAX_AGE)
+    return response
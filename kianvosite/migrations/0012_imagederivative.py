@@ -0,0 +1,27 @@
+# Generated by Django 5.2.10 on 2026-10-18 10:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kianvosite', '0011_add_project_seo_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageDerivative',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(help_text='Storage name of the original upload', max_length=255, unique=True)),
+                ('digest', models.CharField(help_text='Content hash embedded in the derivative file names', max_length=16)),
+                ('width', models.PositiveIntegerField(help_text='Width of the original in pixels')),
+                ('widths', models.JSONField(blank=True, default=list, help_text='Widths generated below the original width')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
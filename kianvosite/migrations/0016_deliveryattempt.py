@@ -0,0 +1,32 @@
+# Generated by Django 5.2.10 on 2026-10-18 10:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kianvosite', '0015_broadcast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254)),
+                ('ok', models.BooleanField(default=False)),
+                ('smtp_code', models.PositiveSmallIntegerField(blank=True, help_text='Server reply code (250 when accepted)', null=True)),
+                ('error', models.TextField(blank=True)),
+                ('latency_ms', models.PositiveIntegerField(default=0, help_text='Time to hand over the message, including retries')),
+                ('retries', models.PositiveSmallIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('broadcast', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='kianvosite.broadcast')),
+                ('subscriber', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='deliveries', to='kianvosite.newslettersubscriber')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.10 on 2026-10-18 10:32
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    for parent, child, fk, counter in [
+        ('ProjectCategory', 'Project', 'category', 'project_count'),
+        ('BlogCategory', 'BlogPost', 'category', 'post_count'),
+        ('GalleryCategory', 'GalleryImage', 'category', 'image_count'),
+        ('Announcement', 'AnnouncementApplication', 'announcement', 'applications_count'),
+    ]:
+        children = apps.get_model('kianvosite', child).objects.filter(**{fk: OuterRef('pk')}).order_by()
+        apps.get_model('kianvosite', parent).objects.update(**{counter: Coalesce(Subquery(
+            children.values(fk).annotate(n=Count('pk')).values('n')
+        ), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kianvosite', '0016_deliveryattempt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='announcement',
+            name='applications_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Maintained by signals; repair with `manage.py recount`', verbose_name='Apps'),
+        ),
+        migrations.AddField(
+            model_name='blogcategory',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Maintained by signals; repair with `manage.py recount`', verbose_name='Posts'),
+        ),
+        migrations.AddField(
+            model_name='gallerycategory',
+            name='image_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Maintained by signals; repair with `manage.py recount`', verbose_name='Images'),
+        ),
+        migrations.AddField(
+            model_name='projectcategory',
+            name='project_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Maintained by signals; repair with `manage.py recount`', verbose_name='Projects'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.10 on 2026-10-18 10:51
+
+import html
+
+from django.db import migrations, models
+from django.utils.html import strip_tags
+
+
+def fill_text_stats(apps, schema_editor):
+    BlogPost = apps.get_model('kianvosite', 'BlogPost')
+    posts = []
+    for post in BlogPost.objects.only('pk', 'content').iterator():
+        post.plain_text = ' '.join(html.unescape(strip_tags(post.content or '')).split())
+        post.word_count = len(post.plain_text.split())
+        post.reading_time = max(1, round(post.word_count / 200))
+        posts.append(post)
+    BlogPost.objects.bulk_update(posts, ['plain_text', 'word_count', 'reading_time'], batch_size=200)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kianvosite', '0017_counter_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='plain_text',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='reading_time',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Minutes'),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_text_stats, migrations.RunPython.noop),
+    ]
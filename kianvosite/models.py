@@ -1,8 +1,19 @@
+import html
+
 from django.db import models
 from django.utils import timezone
 from django.core.validators import FileExtensionValidator
+from django.utils.html import strip_tags
 from ckeditor_uploader.fields import RichTextUploadingField
 
+WORDS_PER_MINUTE = 200
+
+
+def html_to_text(value):
+    """Rich-text HTML as plain text: tags dropped, entities decoded, whitespace collapsed."""
+    return ' '.join(html.unescape(strip_tags(value or '')).split())
+
+
 # Project Category Model
 class ProjectCategory(models.Model):
     name = models.CharField(max_length=100)
@@ -11,6 +22,7 @@ class ProjectCategory(models.Model):
     description = models.TextField(blank=True)
     order = models.IntegerField(default=0)
     is_active = models.BooleanField(default=True)
+    project_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Projects', help_text="Maintained by signals; repair with `manage.py recount`")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -22,6 +34,21 @@ class ProjectCategory(models.Model):
         return self.name
 
 
+# Query profiles: each one joins exactly what the public templates walk, so
+# list pages run a fixed number of queries however many rows they show.
+# for_cards() also leaves out the long text only detail pages render.
+class ProjectQuerySet(models.QuerySet):
+    def for_listing(self):
+        return self.select_related('category')
+
+    def for_cards(self):
+        return self.for_listing().defer('description', 'full_description', 'features')
+
+    def for_showcase(self):
+        """Products page: category badge plus the screenshot strip."""
+        return self.for_cards().prefetch_related('screenshots')
+
+
 # Project/System Model
 class Project(models.Model):
     STATUS_CHOICES = [
@@ -86,6 +113,8 @@ class Project(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProjectQuerySet.as_manager()
+
     class Meta:
         ordering = ['-is_featured', 'order', '-created_at']
 
@@ -105,6 +134,11 @@ class Project(models.Model):
         return []
 
 
+class ServiceQuerySet(models.QuerySet):
+    def for_cards(self):
+        return self.defer('description', 'features')
+
+
 # Service Model
 class Service(models.Model):
     SERVICE_TYPES = [
@@ -137,6 +171,8 @@ class Service(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ServiceQuerySet.as_manager()
+
     class Meta:
         ordering = ['order', 'name']
 
@@ -149,6 +185,11 @@ class Service(models.Model):
         return []
 
 
+class TestimonialQuerySet(models.QuerySet):
+    def for_listing(self):
+        return self.select_related('project')
+
+
 # Testimonial Model
 class Testimonial(models.Model):
     client_name = models.CharField(max_length=200)
@@ -167,6 +208,8 @@ class Testimonial(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = TestimonialQuerySet.as_manager()
+
     class Meta:
         ordering = ['-is_featured', 'order', '-created_at']
 
@@ -181,6 +224,7 @@ class BlogCategory(models.Model):
     description = models.TextField(blank=True)
     icon_class = models.CharField(max_length=100, default='flaticon-web-research')
     is_active = models.BooleanField(default=True)
+    post_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Posts', help_text="Maintained by signals; repair with `manage.py recount`")
 
     class Meta:
         verbose_name_plural = "Blog Categories"
@@ -190,6 +234,14 @@ class BlogCategory(models.Model):
         return self.name
 
 
+class BlogPostQuerySet(models.QuerySet):
+    def for_listing(self):
+        return self.select_related('category')
+
+    def for_cards(self):
+        return self.for_listing().defer('content', 'plain_text')
+
+
 # Blog Post Model
 class BlogPost(models.Model):
     title = models.CharField(max_length=300)
@@ -205,16 +257,32 @@ class BlogPost(models.Model):
     is_featured = models.BooleanField(default=False)
     is_published = models.BooleanField(default=True)
 
+    # Derived from content on save, so pages never have to parse the HTML
+    plain_text = models.TextField(blank=True, editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    reading_time = models.PositiveIntegerField(default=1, editable=False, help_text="Minutes")
+
     published_date = models.DateTimeField(default=timezone.now)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = BlogPostQuerySet.as_manager()
+
     class Meta:
         ordering = ['-published_date']
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        self.plain_text = html_to_text(self.content)
+        self.word_count = len(self.plain_text.split())
+        self.reading_time = max(1, round(self.word_count / WORDS_PER_MINUTE))
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'content' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'plain_text', 'word_count', 'reading_time'}
+        super().save(*args, **kwargs)
+
 
 # Contact Inquiry Model
 class ContactInquiry(models.Model):
@@ -339,6 +407,11 @@ class SocialLink(models.Model):
         return self.platform
 
 
+class ProductImageQuerySet(models.QuerySet):
+    def for_listing(self):
+        return self.select_related('project')
+
+
 # Product Screenshot / Gallery Image for Projects
 class ProductImage(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='screenshots')
@@ -347,6 +420,8 @@ class ProductImage(models.Model):
     is_featured = models.BooleanField(default=False, help_text="Show as the main showcase image")
     order = models.IntegerField(default=0)
 
+    objects = ProductImageQuerySet.as_manager()
+
     class Meta:
         ordering = ['-is_featured', 'order']
         verbose_name_plural = "Product Screenshots"
@@ -363,6 +438,7 @@ class GalleryCategory(models.Model):
     icon_class = models.CharField(max_length=100, blank=True, help_text="FontAwesome class")
     is_active = models.BooleanField(default=True)
     order = models.IntegerField(default=0)
+    image_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Images', help_text="Maintained by signals; repair with `manage.py recount`")
 
     class Meta:
         verbose_name_plural = "Gallery Categories"
@@ -372,6 +448,11 @@ class GalleryCategory(models.Model):
         return self.name
 
 
+class GalleryImageQuerySet(models.QuerySet):
+    def for_listing(self):
+        return self.select_related('category')
+
+
 # Past Classes Gallery Image
 class GalleryImage(models.Model):
     category = models.ForeignKey(GalleryCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name='images')
@@ -384,6 +465,8 @@ class GalleryImage(models.Model):
     order = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = GalleryImageQuerySet.as_manager()
+
     class Meta:
         ordering = ['-is_featured', 'order', '-event_date']
         verbose_name_plural = "Gallery Images"
@@ -392,6 +475,11 @@ class GalleryImage(models.Model):
         return self.title
 
 
+class AnnouncementQuerySet(models.QuerySet):
+    def for_cards(self):
+        return self.defer('description', 'prerequisites', 'application_fields')
+
+
 # Announcement (Bootcamps, Training, Programming Sessions)
 class Announcement(models.Model):
     ANNOUNCEMENT_TYPES = [
@@ -442,10 +530,13 @@ Field types: text, email, phone, textarea, select:option1,option2. Default field
     is_active = models.BooleanField(default=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
     order = models.IntegerField(default=0)
+    applications_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Apps', help_text="Maintained by signals; repair with `manage.py recount`")
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = AnnouncementQuerySet.as_manager()
+
     class Meta:
         ordering = ['-is_featured', 'order', '-created_at']
 
@@ -455,9 +546,6 @@ Field types: text, email, phone, textarea, select:option1,option2. Default field
     def is_accepting_applications(self):
         return self.status == 'open' and self.is_active
 
-    def applications_count(self):
-        return self.applications.count()
-
 
 # Announcement Application
 class AnnouncementApplication(models.Model):
@@ -529,3 +617,132 @@ class ActiveProduct(models.Model):
 
     def __str__(self):
         return self.name
+
+
+# Responsive derivatives generated for an uploaded image (see images.py)
+class ImageDerivative(models.Model):
+    source = models.CharField(max_length=255, unique=True, help_text="Storage name of the original upload")
+    digest = models.CharField(max_length=16, help_text="Content hash embedded in the derivative file names")
+    width = models.PositiveIntegerField(help_text="Width of the original in pixels")
+    widths = models.JSONField(default=list, blank=True, help_text="Widths generated below the original width")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return self.source
+
+
+# Background media-processing job (drained by `manage.py process_media_jobs`)
+class MediaJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    source = models.CharField(max_length=255, unique=True, help_text="Storage name of the uploaded image")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    run_after = models.DateTimeField(default=timezone.now, help_text="Not picked up before this time (retry backoff)")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.source} ({self.status})"
+
+
+# Outgoing email waiting to be sent (drained by `manage.py send_outbox`)
+class EmailOutbox(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Sending'),
+        ('done', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body_text = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255, blank=True, help_text="Leave blank for DEFAULT_FROM_EMAIL")
+    to = models.JSONField(default=list, help_text="Recipient addresses")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    run_after = models.DateTimeField(default=timezone.now, help_text="Not picked up before this time (retry backoff)")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "Email Outbox"
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.subject} ({self.status})"
+
+
+# Newsletter send to every active subscriber (drained by `manage.py send_broadcasts`)
+class Broadcast(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Queued'),
+        ('running', 'Sending'),
+        ('done', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    blog_post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, null=True, blank=True, related_name='broadcasts')
+    announcement = models.ForeignKey(Announcement, on_delete=models.CASCADE, null=True, blank=True, related_name='broadcasts')
+    title = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
+    total = models.PositiveIntegerField(default=0, help_text="Active subscribers when queued")
+    sent = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    last_subscriber_id = models.PositiveBigIntegerField(default=0, help_text="Subscribers up to this id have been handled (resume point)")
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    run_after = models.DateTimeField(default=timezone.now, help_text="Not picked up before this time (retry backoff)")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.title} ({self.status})"
+
+    @property
+    def pending(self):
+        return max(self.total - self.sent - self.failed, 0)
+
+    @property
+    def progress(self):
+        """Percentage of recipients handled so far."""
+        if self.status == 'done' or not self.total:
+            return 100 if self.status == 'done' else 0
+        return min(round(100 * (self.sent + self.failed) / self.total), 100)
+
+
+# Outcome of one newsletter broadcast to one subscriber
+class DeliveryAttempt(models.Model):
+    broadcast = models.ForeignKey(Broadcast, on_delete=models.CASCADE, related_name='deliveries')
+    subscriber = models.ForeignKey(NewsletterSubscriber, on_delete=models.SET_NULL, null=True, blank=True, related_name='deliveries')
+    email = models.EmailField()
+    ok = models.BooleanField(default=False)
+    smtp_code = models.PositiveSmallIntegerField(null=True, blank=True, help_text="Server reply code (250 when accepted)")
+    error = models.TextField(blank=True)
+    latency_ms = models.PositiveIntegerField(default=0, help_text="Time to hand over the message, including retries")
+    retries = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.email} ({'sent' if self.ok else 'failed'})"
@@ -0,0 +1,252 @@
+"""
+Newsletter fan-out.
+
+Every subscriber gets a message of their own, so nobody sees the rest of the
+list, and a bad address fails only itself. Messages go out in batches of
+NEWSLETTER_BATCH_SIZE, each over a single SMTP connection, paced to
+NEWSLETTER_RATE messages per second to stay inside the mail server's limits.
+
+A Campaign is rendered once, with placeholders for the per-recipient parts
+(address, unsubscribe link); personalising it for each subscriber is then
+just string joins, not a template render.
+"""
+import logging
+import re
+import smtplib
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core import signing
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.urls import reverse
+from django.utils.html import escape
+
+logger = logging.getLogger(__name__)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def subscriber_batches(after=0, batch_size=None):
+    """Active subscribers with a pk above ``after``, as lists of (pk, email) in pk order."""
+    from .models import NewsletterSubscriber
+
+    batch_size = batch_size or settings.NEWSLETTER_BATCH_SIZE
+    rows = (
+        NewsletterSubscriber.objects.filter(is_active=True, pk__gt=after)
+        .order_by('pk').values_list('pk', 'email')
+        .iterator(chunk_size=batch_size)
+    )
+    return chunked(rows, batch_size)
+
+
+UNSUBSCRIBE_SALT = 'kianvosite.newsletter.unsubscribe'
+
+
+def unsubscribe_token(email):
+    return signing.dumps(email.lower(), salt=UNSUBSCRIBE_SALT)
+
+
+def unsubscribe_email(token):
+    """The address a token from unsubscribe_token() was made for, or None if it is not genuine."""
+    try:
+        return signing.loads(token, salt=UNSUBSCRIBE_SALT)
+    except signing.BadSignature:
+        return None
+
+
+RESUBSCRIBE_SALT = 'kianvosite.newsletter.resubscribe'
+RESUBSCRIBE_MAX_AGE = 3 * 24 * 60 * 60
+
+
+def resubscribe_token(email):
+    return signing.dumps(email.lower(), salt=RESUBSCRIBE_SALT)
+
+
+def resubscribe_email(token):
+    """
+    The address a token from resubscribe_token() was made for, or None if it
+    is not genuine or older than RESUBSCRIBE_MAX_AGE.
+    """
+    try:
+        return signing.loads(token, salt=RESUBSCRIBE_SALT, max_age=RESUBSCRIBE_MAX_AGE)
+    except signing.BadSignature:
+        return None
+
+
+class Campaign:
+    """
+    A newsletter rendered once for all recipients. Build the bodies with
+    Campaign.placeholders() in the template context; render() then splices a
+    recipient's values into the pre-split text.
+    """
+    PERSONAL_FIELDS = ('email', 'unsubscribe_url')
+    # Only the personal fields: any other [[kv:...]] in a post is its text
+    PLACEHOLDER = re.compile(rf'\[\[kv:({"|".join(PERSONAL_FIELDS)})\]\]')
+
+    def __init__(self, subject, body_text, html_body=''):
+        self.subject = subject
+        # re.split with a group alternates literal text and field names
+        self._text = self.PLACEHOLDER.split(body_text)
+        self._html = self.PLACEHOLDER.split(html_body) if html_body else None
+        url = settings.SITE_URL + reverse('newsletter_unsubscribe', args=['token'])
+        self._unsubscribe_prefix, self._unsubscribe_suffix = url.rsplit('token', 1)
+
+    @classmethod
+    def placeholders(cls):
+        return {name: f'[[kv:{name}]]' for name in cls.PERSONAL_FIELDS}
+
+    def personal_values(self, email):
+        return {
+            'email': email,
+            'unsubscribe_url': self._unsubscribe_prefix + unsubscribe_token(email) + self._unsubscribe_suffix,
+        }
+
+    def render(self, values):
+        """(text body, HTML body) for one recipient's ``values``."""
+        text = ''.join(values[part] if i % 2 else part for i, part in enumerate(self._text))
+        if self._html is None:
+            return text, ''
+        html = ''.join(escape(values[part]) if i % 2 else part for i, part in enumerate(self._html))
+        return text, html
+
+
+class Throttle:
+    """Sleep as needed so calls to wait() average at most ``rate`` per second."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_at = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if now < self.next_at:
+            time.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + self.interval
+
+
+class Delivery:
+    """Outcome of sending to one recipient."""
+
+    def __init__(self, email, ok, code=None, error='', latency_ms=0, retries=0):
+        self.email = email
+        self.ok = ok
+        self.code = code
+        self.error = error
+        self.latency_ms = latency_ms
+        self.retries = retries
+
+
+def _smtp_code(error):
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return next(iter(error.recipients.values()), (None,))[0]
+    return getattr(error, 'smtp_code', None)
+
+
+def _is_transient(error, code):
+    """4xx replies and dropped connections are worth another try; 5xx are not."""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPException):
+        return code is not None and 400 <= code < 500
+    # Socket errors and timeouts
+    return isinstance(error, OSError)
+
+
+def _send_one(connection, message, email, retries):
+    started = time.monotonic()
+    for attempt in range(retries + 1):
+        try:
+            message.send(fail_silently=False)
+            return Delivery(email, True, 250, latency_ms=round((time.monotonic() - started) * 1000), retries=attempt)
+        except Exception as e:
+            code = _smtp_code(e)
+            if attempt == retries or not _is_transient(e, code):
+                return Delivery(email, False, code, str(e), round((time.monotonic() - started) * 1000), attempt)
+            # Reconnect before retrying: the server may have dropped us
+            try:
+                connection.close()
+                connection.open()
+            except Exception:
+                pass
+
+
+def send_batch(campaign, emails, throttle, retries=None):
+    """
+    Send ``campaign`` to each of ``emails`` over one SMTP connection, retrying
+    temporary failures up to NEWSLETTER_RETRIES times. Returns one Delivery
+    per address, or raises if the connection cannot be opened at all.
+    """
+    retries = settings.NEWSLETTER_RETRIES if retries is None else retries
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        # Nobody in the batch has been tried; let the caller retry it later
+        logger.error(f'Newsletter "{campaign.subject}": cannot connect for {len(emails)} recipients: {e}')
+        raise
+
+    deliveries = []
+    try:
+        for email in emails:
+            throttle.wait()
+            values = campaign.personal_values(email)
+            body_text, html_body = campaign.render(values)
+            message = EmailMultiAlternatives(
+                campaign.subject, body_text, settings.DEFAULT_FROM_EMAIL, [email], connection=connection,
+                headers={
+                    'List-Unsubscribe': f'<{values["unsubscribe_url"]}>',
+                    'List-Unsubscribe-Post': 'List-Unsubscribe=One-Click',
+                },
+            )
+            if html_body:
+                message.attach_alternative(html_body, 'text/html')
+            delivery = _send_one(connection, message, email, retries)
+            if not delivery.ok:
+                logger.warning(f'Newsletter "{campaign.subject}" to {email} failed: {delivery.error}')
+            deliveries.append(delivery)
+    finally:
+        connection.close()
+    return deliveries
+
+
+def queue_broadcast(obj):
+    """
+    Queue a newsletter about a BlogPost or Announcement for every active
+    subscriber; `manage.py send_broadcasts` sends it.
+    """
+    from .models import Announcement, Broadcast, NewsletterSubscriber
+
+    field = 'announcement' if isinstance(obj, Announcement) else 'blog_post'
+    return Broadcast.objects.create(
+        title=str(obj)[:255],
+        total=NewsletterSubscriber.objects.filter(is_active=True).count(),
+        **{field: obj},
+    )
+
+
+def bounced_addresses(message):
+    """
+    Addresses that permanently failed according to a bounce ``message``: the
+    failed 5.x.x recipients of an RFC 3464 delivery report, or the
+    X-Failed-Recipients header some servers send instead.
+    """
+    addresses = set()
+    for part in message.walk():
+        if part.get_content_type() != 'message/delivery-status':
+            continue
+        for fields in part.get_payload():
+            recipient = fields.get('Final-Recipient', '') or fields.get('Original-Recipient', '')
+            action = fields.get('Action', '').strip().lower()
+            status = fields.get('Status', '').strip()
+            if recipient and action == 'failed' and status.startswith('5'):
+                addresses.add(recipient.split(';')[-1].strip().strip('<>').lower())
+    if not addresses and message.get('X-Failed-Recipients'):
+        addresses = {a.strip().lower() for a in message['X-Failed-Recipients'].split(',') if a.strip()}
+    return addresses
@@ -0,0 +1,80 @@
+"""
+Keyset (cursor) pagination for the public list pages.
+
+Instead of OFFSET, each page asks for the rows that sort after the last row
+of the previous page, so page 200 costs the same as page 1. The ?after=
+cursor is an opaque token holding that last row's ordering values; it stays
+valid when rows are added or removed in front of it.
+"""
+import base64
+import json
+from datetime import date
+
+from django.db.models import F, Q
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def _encode(values):
+    values = [v.isoformat() if isinstance(v, date) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def _decode(cursor, fields):
+    """Return the cursor's values converted back to Python, or None if it is malformed."""
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(raw, list) or len(raw) != len(fields):
+            return None
+        return [None if v is None else f.to_python(v) for f, v in zip(fields, raw)]
+    except Exception:
+        return None
+
+
+def _after(name, descending, value):
+    """Rows whose ``name`` sorts strictly after ``value``. NULLs sort lowest."""
+    if descending:
+        return Q(pk__in=[]) if value is None else Q(**{f'{name}__lt': value}) | Q(**{f'{name}__isnull': True})
+    return Q(**{f'{name}__isnull': False}) if value is None else Q(**{f'{name}__gt': value})
+
+
+def _equal(name, value):
+    return Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+
+
+def keyset_page(queryset, ordering, after=None, per_page=12):
+    """
+    Return one KeysetPage of ``queryset`` sorted by ``ordering`` (field names,
+    '-' for descending). The ordering must end in a unique field such as
+    '-id' so the cursor position is unambiguous.
+    """
+    columns = [(o.lstrip('-'), o.startswith('-')) for o in ordering]
+    fields = [queryset.model._meta.get_field(name) for name, _ in columns]
+    queryset = queryset.order_by(*[
+        F(name).desc(nulls_last=True) if descending else F(name).asc(nulls_first=True)
+        for name, descending in columns
+    ])
+
+    values = _decode(after, fields) if after else None
+    if values is not None:
+        # (c1 > v1) OR (c1 = v1 AND c2 > v2) OR ... honouring each direction
+        condition, prefix = Q(pk__in=[]), Q()
+        for (name, descending), value in zip(columns, values):
+            condition |= prefix & _after(name, descending, value)
+            prefix &= _equal(name, value)
+        queryset = queryset.filter(condition)
+
+    items = list(queryset[:per_page + 1])
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        next_cursor = _encode([getattr(items[-1], f.attname) for f in fields])
+    return KeysetPage(items, next_cursor)
@@ -0,0 +1,156 @@
+"""
+Full-text search for the portal list pages.
+
+On SQLite, each model in the portal REGISTRY gets an FTS5 table
+(<db_table>_fts) holding a copy of its 'search' columns, with rowid = pk.
+Signals (see signals.py) re-index a row on save and drop it on delete, and
+post_migrate creates the tables and rebuilds any whose columns changed.
+QuerySet.update() and bulk inserts skip signals; `manage.py
+rebuild_search_index` repairs any drift.
+
+Every word of the query must match the start of a word in the row, and
+results come back best match (BM25) first. Other databases, and queries with
+no words in them, fall back to icontains filters.
+"""
+import logging
+import re
+from functools import cache
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger(__name__)
+
+WORD = re.compile(r'\w+')
+
+
+@cache
+def search_fields():
+    """{model: (column, ...)} for every model the portal can search."""
+    from .portal_views import REGISTRY
+
+    return {
+        meta['model']: tuple(meta['model']._meta.get_field(name).column for name in meta['search'])
+        for meta in REGISTRY.values() if meta.get('search')
+    }
+
+
+def enabled():
+    return connection.vendor == 'sqlite'
+
+
+# Index tables known to exist. Only hits are remembered: a worker that looked
+# before migrate built a table has to find it on a later look.
+_built = set()
+
+
+def _exists(fts):
+    if fts not in _built and fts in connection.introspection.table_names():
+        _built.add(fts)
+    return fts in _built
+
+
+def _indexed(model):
+    # Until migrate or rebuild_search_index has built a model's table, saves
+    # skip it and searches use icontains.
+    return enabled() and model in search_fields() and _exists(_table(model))
+
+
+def _table(model):
+    return f'{model._meta.db_table}_fts'
+
+
+def _quoted(names):
+    return ', '.join(connection.ops.quote_name(name) for name in names)
+
+
+def _indexed_columns(model):
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA table_info({connection.ops.quote_name(_table(model))})')
+        return tuple(row[1] for row in cursor.fetchall())
+
+
+def rebuild(model):
+    """Re-create ``model``'s index from its table."""
+    columns = search_fields()[model]
+    table, fts = model._meta.db_table, _table(model)
+    quote = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {quote(fts)}')
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE {quote(fts)} USING fts5('
+            f"{_quoted(columns)}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        cursor.execute(
+            f'INSERT INTO {quote(fts)} (rowid, {_quoted(columns)}) '
+            f'SELECT {quote(model._meta.pk.column)}, {_quoted(columns)} FROM {quote(table)}'
+        )
+    _built.add(fts)
+
+
+def sync_schema():
+    """Build the indexes that are missing or were built over other columns."""
+    if not enabled():
+        return
+    for model, columns in search_fields().items():
+        if _indexed_columns(model) == columns:
+            continue
+        try:
+            rebuild(model)
+        except DatabaseError as e:
+            # The model's table is behind its code (a partial migrate)
+            logger.warning(f'Search index for {model._meta.label} not built: {e}')
+
+
+def index(instance):
+    model = type(instance)
+    if not _indexed(model):
+        return
+    columns = search_fields()[model]
+    fts = connection.ops.quote_name(_table(model))
+    values = [getattr(instance, model._meta.get_field(column).attname) for column in columns]
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {fts} WHERE rowid = %s', [instance.pk])
+        cursor.execute(
+            f'INSERT INTO {fts} (rowid, {_quoted(columns)}) VALUES (%s, {", ".join(["%s"] * len(columns))})',
+            [instance.pk, *values],
+        )
+
+
+def unindex(model, pk):
+    if not _indexed(model):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {connection.ops.quote_name(_table(model))} WHERE rowid = %s', [pk])
+
+
+def match_expression(query):
+    """'web dev' -> '"web"* "dev"*': every word, as a prefix. None if there are no words."""
+    return ' '.join(f'"{word}"*' for word in WORD.findall(query)) or None
+
+
+def search(queryset, query, fields):
+    """
+    Narrow ``queryset`` to rows matching ``query``. On SQLite the rows are
+    annotated with ``search_rank`` (lower is better) for ordering.
+    """
+    model = queryset.model
+    expression = match_expression(query)
+    if expression is None or not _indexed(model):
+        q = Q()
+        for field in fields:
+            q |= Q(**{f'{field}__icontains': query})
+        return queryset.filter(q)
+
+    # The MATCH runs once: the rank comes from the matches materialised as a
+    # CTE, which SQLite probes through an automatic index on rowid. Querying
+    # the index afresh for each row would take seconds on a broad query.
+    quote = connection.ops.quote_name
+    fts = quote(_table(model))
+    matches = f'SELECT rowid FROM {fts} WHERE {fts} MATCH %s'
+    rank = (
+        f'WITH ranked AS MATERIALIZED (SELECT rowid AS id, rank FROM {fts} WHERE {fts} MATCH %s) '
+        f'SELECT rank FROM ranked WHERE id = {quote(model._meta.db_table)}.{quote(model._meta.pk.column)}'
+    )
+    return queryset.filter(pk__in=RawSQL(matches, [expression])).annotate(search_rank=RawSQL(rank, [expression]))
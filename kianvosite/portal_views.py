@@ -3,10 +3,11 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django import forms
-from django.db.models import Count
+from django.db.models import Count, Q, Value, CharField
 from django.utils import timezone
 from django.urls import reverse
 from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse
 from django.utils.html import format_html, mark_safe
 from ckeditor_uploader.widgets import CKEditorUploadingWidget
 from .models import (
@@ -15,9 +16,12 @@ from .models import (
     CompanyStat, Partner, TeamMember, Announcement,
     AnnouncementApplication, GalleryImage, GalleryCategory,
     ProductImage, SocialLink,
-    HeroSlide, ActiveProduct
+    HeroSlide, ActiveProduct, MediaJob, EmailOutbox, Broadcast
 )
-from .utils import send_new_blog_notification, send_new_announcement_notification, send_blog_to_subscribers, send_announcement_to_subscribers
+from .utils import send_new_blog_notification, send_new_announcement_notification
+from .newsletter import queue_broadcast
+from .caching import cached_section
+from . import portal_search
 
 # ---------------------------------------------------------------------------
 #  Icon picker
@@ -143,29 +147,47 @@ def portal_logout(request):
 #  Dashboard
 # ---------------------------------------------------------------------------
 
+# Sidebar/dashboard counters: name -> (model, filter)
+STAT_COUNTERS = {
+    'total_projects': (Project, Q(is_active=True)),
+    'total_product_images': (ProductImage, Q()),
+    'total_services': (Service, Q(is_active=True)),
+    'total_blog_posts': (BlogPost, Q(is_published=True)),
+    'total_inquiries': (ContactInquiry, Q()),
+    'pending_inquiries': (ContactInquiry, Q(status='new')),
+    'total_subscribers': (NewsletterSubscriber, Q(is_active=True)),
+    'total_team': (TeamMember, Q(is_active=True)),
+    'total_announcements': (Announcement, Q(is_active=True)),
+    'open_announcements': (Announcement, Q(status='open')),
+    'total_applications': (AnnouncementApplication, Q()),
+    'total_gallery': (GalleryImage, Q(is_active=True)),
+    'total_partners': (Partner, Q(is_active=True)),
+    'total_testimonials': (Testimonial, Q(is_active=True)),
+    'total_categories': (ProjectCategory, Q(is_active=True)),
+    'total_gallery_cats': (GalleryCategory, Q(is_active=True)),
+    'total_social_links': (SocialLink, Q(is_active=True)),
+    'total_hero_slides': (HeroSlide, Q(is_active=True)),
+    'total_active_products': (ActiveProduct, Q(is_active=True)),
+    'total_stats': (CompanyStat, Q(is_active=True)),
+}
+
+
+def _count_stats():
+    """All STAT_COUNTERS in one statement: a UNION ALL of one COUNT per counter."""
+    counts = [
+        model.objects.filter(condition).order_by()
+        .annotate(key=Value(name, output_field=CharField())).values('key')
+        .annotate(n=Count('pk')).values_list('key', 'n')
+        for name, (model, condition) in STAT_COUNTERS.items()
+    ]
+    totals = dict(counts[0].union(*counts[1:], all=True))
+    return {name: totals.get(name, 0) for name in STAT_COUNTERS}
+
+
 def _stats():
-    return {
-        'total_projects': Project.objects.filter(is_active=True).count(),
-        'total_product_images': ProductImage.objects.count(),
-        'total_services': Service.objects.filter(is_active=True).count(),
-        'total_blog_posts': BlogPost.objects.filter(is_published=True).count(),
-        'total_inquiries': ContactInquiry.objects.count(),
-        'pending_inquiries': ContactInquiry.objects.filter(status='new').count(),
-        'total_subscribers': NewsletterSubscriber.objects.filter(is_active=True).count(),
-        'total_team': TeamMember.objects.filter(is_active=True).count(),
-        'total_announcements': Announcement.objects.filter(is_active=True).count(),
-        'open_announcements': Announcement.objects.filter(status='open').count(),
-        'total_applications': AnnouncementApplication.objects.count(),
-        'total_gallery': GalleryImage.objects.filter(is_active=True).count(),
-        'total_partners': Partner.objects.filter(is_active=True).count(),
-        'total_testimonials': Testimonial.objects.filter(is_active=True).count(),
-        'total_categories': ProjectCategory.objects.filter(is_active=True).count(),
-        'total_gallery_cats': GalleryCategory.objects.filter(is_active=True).count(),
-        'total_social_links': SocialLink.objects.filter(is_active=True).count(),
-        'total_hero_slides': HeroSlide.objects.filter(is_active=True).count(),
-        'total_active_products': ActiveProduct.objects.filter(is_active=True).count(),
-        'total_stats': CompanyStat.objects.filter(is_active=True).count(),
-    }
+    """Cached until one of the counted models is written (see signals.py)."""
+    models = tuple(dict.fromkeys(model for model, _ in STAT_COUNTERS.values()))
+    return cached_section('portal', 'stats', models, _count_stats)
 
 SIDEBAR = [
     {'name':'Content', 'links':[
@@ -215,7 +237,18 @@ def portal_dashboard(request):
             ('New Team Member','fas fa-user-plus','teammembers','create','#10b981'),
             ('New Announcement','fas fa-bullhorn','announcements','create','#ffc107'),
         ],
-        'pending_count': ContactInquiry.objects.filter(status='new').count(),
+        'media_jobs': MediaJob.objects.aggregate(
+            pending=Count('pk', filter=Q(status='pending')),
+            running=Count('pk', filter=Q(status='running')),
+            done=Count('pk', filter=Q(status='done')),
+            failed=Count('pk', filter=Q(status='failed')),
+        ),
+        'failed_media_jobs': MediaJob.objects.filter(status='failed').order_by('-updated_at')[:5],
+        'broadcasts': Broadcast.objects.order_by('-created_at')[:5],
+        'outbox': EmailOutbox.objects.aggregate(
+            pending=Count('pk', filter=Q(status__in=['pending', 'running'])),
+            failed=Count('pk', filter=Q(status='failed')),
+        ),
     }
     return render(request, 'portal/dashboard.html', context)
 
@@ -406,14 +439,92 @@ def _build_form(model, meta, data=None, files=None, instance=None):
     return form
 
 
+def _label_field(model):
+    """The column shown for ``model``'s rows in filter dropdowns."""
+    names = {f.name for f in model._meta.fields}
+    return next((n for n in ('name', 'title', 'full_name', 'email') if n in names), 'pk')
+
+
+def _related_choices(fmodel):
+    """
+    [(pk, label), ...] for a foreign-key filter, or None when the table is
+    larger than PORTAL_FILTER_CHOICE_LIMIT and the filter should autocomplete.
+    Cached until ``fmodel`` is written.
+    """
+    from django.conf import settings
+
+    limit = settings.PORTAL_FILTER_CHOICE_LIMIT
+    label = _label_field(fmodel)
+
+    def build():
+        rows = list(fmodel.objects.order_by(label).values_list('pk', label)[:limit + 1])
+        if len(rows) > limit:
+            return None
+        return [(str(pk), str(text)) for pk, text in rows]
+
+    return cached_section('portal', f'choices:{fmodel._meta.label_lower}', (fmodel,), build)
+
+
+def _estimated_count(model):
+    """
+    A row count for ``model``'s whole table that costs no scan: the planner's
+    statistics on PostgreSQL, elsewhere an exact count cached until the next
+    write to the model (QuerySet.update() and bulk writes can leave it behind).
+    """
+    from django.db import connection
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return int(row[0])
+    return cached_section('portal', f'count:{model._meta.label_lower}', (model,), model.objects.count)
+
+
+class EstimatedPaginator(Paginator):
+    """
+    A Paginator that takes the object count it is given instead of counting.
+    The estimate can run past the end of the table: a short page shows where
+    the end really is, and a page past it costs one exact count and is
+    replaced by the last page.
+    """
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._count = count
+
+    @property
+    def count(self):
+        return self._count
+
+    def _recount(self, count):
+        self._count = count
+        self.__dict__.pop('num_pages', None)
+
+    def page(self, number):
+        page = super().page(number)
+        rows = len(page.object_list)
+        if not rows and page.number > 1:
+            self._recount(self.object_list.count())
+            page = super().page(self.num_pages)
+            rows = len(page.object_list)
+        if rows < self.per_page:
+            self._recount((page.number - 1) * self.per_page + rows)
+        return page
+
+
 def _get_filter_choices(meta):
-    """Return list of (field_name, [(value, label), ...]) for filter dropdowns."""
+    """
+    Return list of (field_name, [(value, label), ...]) for filter dropdowns.
+    The options are None for a foreign key that needs an autocomplete box.
+    """
     choices = []
     fm = meta.get('filter_map', {})
     for fname, fmodel in fm.items():
         if fmodel is not None:
-            opts = [(str(o.pk), str(o)) for o in fmodel.objects.filter(is_active=True)] + [('','All')]
-            choices.append((fname, [('','All')] + [(str(o.pk), str(o)) for o in fmodel.objects.all()]))
+            opts = _related_choices(fmodel)
+            choices.append((fname, None if opts is None else [('', 'All')] + opts))
         else:
             # choice field on model itself
             field = meta['model']._meta.get_field(fname)
@@ -423,6 +534,31 @@ def _get_filter_choices(meta):
     return choices
 
 
+def _autocomplete_labels(meta, filter_choices, current_filters):
+    """Labels of the rows currently selected in autocomplete filters."""
+    labels = {}
+    for fname, opts in filter_choices:
+        value = current_filters.get(fname)
+        if opts is None and value:
+            fmodel = meta['filter_map'][fname]
+            labels[fname] = fmodel.objects.filter(pk=value).values_list(_label_field(fmodel), flat=True).first() or ''
+    return labels
+
+
+def _list_profile(qs, meta):
+    """
+    Load only what a list row shows: the listed columns and images, with
+    listed foreign keys joined rather than fetched row by row.
+    """
+    columns = {f.name: f for f in meta['model']._meta.concrete_fields}
+    qs = qs.select_related(*[name for name in meta['list'] if name in columns and columns[name].many_to_one])
+    shown = [*meta['list'], *meta.get('img', [])]
+    # A listed property could read any column, so then load them all
+    if all(name in columns for name in shown):
+        qs = qs.only(*shown)
+    return qs
+
+
 def _get_display_value(obj, field_name, meta):
     """Return a display-friendly value for a field."""
     if field_name == 'category' and hasattr(obj, 'category') and obj.category:
@@ -462,11 +598,7 @@ def portal_list(request, model_name):
     qs = meta['model'].objects.all()
     search_query = request.GET.get('q', '')
     if search_query:
-        from django.db.models import Q
-        q = Q()
-        for field in meta.get('search', []):
-            q |= Q(**{f'{field}__icontains': search_query})
-        qs = qs.filter(q)
+        qs = portal_search.search(qs, search_query, meta.get('search', []))
 
     # Filters
     filter_params = {}
@@ -480,15 +612,31 @@ def portal_list(request, model_name):
     if filter_params:
         qs = qs.filter(**filter_params)
 
+    qs = _list_profile(qs, meta)
     ordering = meta.get('order', ['-id'])
+    if 'search_rank' in qs.query.annotations:
+        ordering = ['search_rank', *ordering]
     qs = qs.order_by(*ordering)
 
-    paginator = Paginator(qs, 20)
+    # COUNT(*) over a whole large table is a full scan; estimate it unless the
+    # list is narrowed down or the user asked for the exact figure.
+    from django.conf import settings
+    exact = request.GET.get('exact') == '1'
+    estimate = None
+    if not (exact or search_query or filter_params):
+        estimate = _estimated_count(meta['model'])
+        if estimate < settings.PORTAL_ESTIMATE_COUNT_ABOVE:
+            estimate = None
+    if estimate is None:
+        paginator = Paginator(qs, 20)
+    else:
+        paginator = EstimatedPaginator(qs, 20, estimate)
     page = request.GET.get('page', 1)
     page_obj = paginator.get_page(page)
 
     filter_choices = _get_filter_choices(meta)
     current_filters = {fname: request.GET.get(fname, '') for fname in meta.get('filter_map', {})}
+    autocomplete_labels = _autocomplete_labels(meta, filter_choices, current_filters)
 
     context = {
         'sections': SIDEBAR,
@@ -499,12 +647,31 @@ def portal_list(request, model_name):
         'search_query': search_query,
         'filter_choices': filter_choices,
         'current_filters': current_filters,
+        'autocomplete_labels': autocomplete_labels,
         'list_fields': meta['list'],
-        'total_count': qs.count(),
+        'total_count': paginator.count,
+        'count_is_estimate': estimate is not None,
+        'exact_count': exact,
     }
     return render(request, 'portal/model_list.html', context)
 
 
+@login_required
+def portal_autocomplete(request, model_name, field):
+    """JSON matches for a foreign-key filter too large for a dropdown."""
+    meta = _get_meta(model_name)
+    fmodel = meta.get('filter_map', {}).get(field)
+    if fmodel is None:
+        raise Http404
+    label = _label_field(fmodel)
+    term = request.GET.get('q', '').strip()
+    qs = fmodel.objects.order_by(label)
+    if term:
+        qs = qs.filter(**{f'{label}__icontains': term})
+    results = [{'id': pk, 'text': str(text)} for pk, text in qs.values_list('pk', label)[:20]]
+    return JsonResponse({'results': results})
+
+
 @login_required
 def portal_create(request, model_name):
     meta = _get_meta(model_name)
@@ -528,10 +695,10 @@ def portal_create(request, model_name):
 
             if model_name == 'blogposts' and hasattr(obj, 'is_published') and obj.is_published:
                 send_new_blog_notification(obj)
-                send_blog_to_subscribers(obj)
+                queue_broadcast(obj)
             elif model_name == 'announcements':
                 send_new_announcement_notification(obj)
-                send_announcement_to_subscribers(obj)
+                queue_broadcast(obj)
 
             return redirect('portal_list', model_name=model_name)
         else:
@@ -0,0 +1,124 @@
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate
+from django.core.cache import cache
+from django.db import transaction
+from django.apps import apps
+from django.dispatch import receiver
+
+from .caching import bump_version, purge_pages, ALL_PAGES
+from .counters import counted_fields, adjust
+from .images import image_fields, missing_sources, enqueue, derivative_cache_key
+from . import portal_search, site_search
+
+# Public page sections that display each model. A write purges those sections
+# from the page cache; a section covers its list page and every detail page
+# under it, since detail pages show related/prev/next siblings too.
+PAGE_DEPENDENCIES = {
+    'Project': ['/', '/portfolio/', '/products/', '/services/', '/testimonials/', '/search/'],
+    'ProjectCategory': ['/portfolio/', '/products/'],
+    'ProductImage': ['/portfolio/', '/products/'],
+    'Service': ['/', '/services/', '/search/'],
+    'Testimonial': ['/', '/about/', '/testimonials/'],
+    'BlogCategory': ['/blog/'],
+    'BlogPost': ['/', '/blog/', '/search/'],
+    'CompanyStat': ['/', '/about/', '/portfolio/', '/testimonials/'],
+    'Partner': ['/', '/partners/'],
+    'TeamMember': ['/', '/about/', '/team/'],
+    'GalleryCategory': ['/gallery/'],
+    'GalleryImage': ['/gallery/'],
+    'Announcement': ['/', '/announcements/', '/search/'],
+    'HeroSlide': ['/'],
+    'ActiveProduct': ['/'],
+    # Rendered in the footer of every page
+    'SocialLink': [ALL_PAGES],
+}
+
+
+def pages_showing(sources):
+    """
+    The page sections that can show any of the image ``sources``: those of
+    every model with an ImageField uploading to where a source lives. New
+    derivatives change those pages' srcsets; process_media_jobs purges them
+    once per batch rather than on every ImageDerivative save.
+    """
+    sections = set()
+    for model in apps.get_app_config('kianvosite').get_models():
+        for name in image_fields(model):
+            upload_to = model._meta.get_field(name).upload_to
+            if any(source.startswith(upload_to) for source in sources):
+                sections.update(PAGE_DEPENDENCIES.get(model.__name__, []))
+    return sections
+
+
+@receiver([post_save, post_delete], dispatch_uid='kianvosite_bump_version')
+def bump_model_version(sender, **kwargs):
+    """Any write to one of our models invalidates the caches built from it."""
+    if sender._meta.app_label == 'kianvosite':
+        bump_version(sender)
+        sections = PAGE_DEPENDENCIES.get(sender.__name__)
+        if sections:
+            purge_pages(*sections)
+
+
+@receiver(post_save, dispatch_uid='kianvosite_image_derivatives')
+def queue_image_derivatives(sender, instance, raw=False, **kwargs):
+    """Queue responsive derivatives for newly uploaded images (see process_media_jobs)."""
+    if raw or sender._meta.app_label != 'kianvosite' or not image_fields(sender):
+        return
+    for source in missing_sources(instance):
+        enqueue(source)
+
+
+@receiver([post_save, post_delete], sender='kianvosite.ImageDerivative', dispatch_uid='kianvosite_derivative_cache')
+def forget_derivative(sender, instance, **kwargs):
+    """The {% responsive_image %} tag caches each source's derivatives; drop the stale entry."""
+    cache.delete(derivative_cache_key(instance.source))
+
+
+@receiver(pre_save, dispatch_uid='kianvosite_counter_previous')
+def remember_counted_parents(sender, instance, raw=False, **kwargs):
+    """Note which parents an existing row pointed at, in case the save moves it."""
+    fields = counted_fields(sender)
+    if raw or not fields or instance._state.adding:
+        return
+    instance._counted_parents = sender.objects.filter(pk=instance.pk).values(*[f.attname for f, _ in fields]).first()
+
+
+@receiver(post_save, dispatch_uid='kianvosite_counter_save')
+def count_saved_child(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_counted_parents', None) or {}
+    # A move updates two parents; both land or neither does
+    with transaction.atomic():
+        for field, counter in counted_fields(sender):
+            old = None if created else previous.get(field.attname)
+            new = getattr(instance, field.attname)
+            if old != new:
+                adjust(field, counter, old, -1)
+                adjust(field, counter, new, 1)
+
+
+@receiver(post_delete, dispatch_uid='kianvosite_counter_delete')
+def count_deleted_child(sender, instance, **kwargs):
+    with transaction.atomic():
+        for field, counter in counted_fields(sender):
+            adjust(field, counter, getattr(instance, field.attname), -1)
+
+
+@receiver(post_save, dispatch_uid='kianvosite_search_save')
+def index_for_search(sender, instance, **kwargs):
+    portal_search.index(instance)
+    site_search.index(instance)
+
+
+@receiver(post_delete, dispatch_uid='kianvosite_search_delete')
+def unindex_for_search(sender, instance, **kwargs):
+    portal_search.unindex(sender, instance.pk)
+    site_search.unindex(sender, instance.pk)
+
+
+@receiver(post_migrate, dispatch_uid='kianvosite_search_schema')
+def sync_search_indexes(sender, using='default', **kwargs):
+    if sender.name == 'kianvosite' and using == 'default':
+        portal_search.sync_schema()
+        site_search.sync_schema()
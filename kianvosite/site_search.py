@@ -0,0 +1,178 @@
+"""
+Public site search (/search/).
+
+Projects, services, blog posts and announcements that visitors can see share
+one FTS5 index, kianvosite_site_search: a title and a plain-text body per
+document, plus the kind and slug needed to link to it, so a search is a
+single query. Signals (see signals.py) re-index a document when it is saved
+and drop it when it is deleted or hidden; `manage.py rebuild_search_index`
+builds the whole index in bulk.
+
+Matches are ranked with BM25, titles counting for more than bodies, and come
+back with the matched words marked in the title and a snippet of the body.
+Other databases fall back to icontains filters, unranked.
+"""
+from django.apps import apps
+from django.db import connection, transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from django.utils.text import Truncator
+
+from .models import html_to_text
+from .portal_search import enabled, match_expression
+
+TABLE = 'kianvosite_site_search'
+MAX_RESULTS = 30
+TITLE_WEIGHT = 5.0
+
+# kind -> (model, what visitors can see, title field, body fields, detail url).
+# The visibility filters match the public list pages.
+DOCUMENTS = {
+    'project': ('Project', {'is_active': True}, 'name', ('tagline', 'description', 'technologies'), 'project_detail'),
+    'service': ('Service', {'is_active': True}, 'name', ('short_description', 'description', 'technologies'), 'service_detail'),
+    'blog': ('BlogPost', {'is_published': True}, 'title', ('excerpt', 'plain_text'), 'blog_detail'),
+    'announcement': ('Announcement', {'is_active': True, 'status__in': ['open', 'closed']}, 'title', ('short_description', 'description'), 'announcement_detail'),
+}
+LABELS = {'project': 'Project', 'service': 'Service', 'blog': 'Blog Post', 'announcement': 'Announcement'}
+
+# Highlight markers: control characters cannot occur in the indexed text, so
+# the text can be escaped before they are turned into <mark> tags.
+MARK_START, MARK_END = '\x02', '\x03'
+
+
+def _kind(model):
+    return next((kind for kind, spec in DOCUMENTS.items() if spec[0] == model.__name__), None)
+
+
+def _rowid(kind, pk):
+    # Fixed width, so adding a kind later leaves existing rowids alone
+    return pk * 16 + list(DOCUMENTS).index(kind)
+
+
+def _document(kind, obj):
+    _, _, title, body, _ = DOCUMENTS[kind]
+    return html_to_text(getattr(obj, title)), ' '.join(html_to_text(getattr(obj, f)) for f in body)
+
+
+def _visible(kind, obj):
+    """``obj`` checked against its kind's filter, in Python; only exact and __in lookups."""
+    for lookup, value in DOCUMENTS[kind][1].items():
+        field, _, operator = lookup.partition('__')
+        actual = getattr(obj, field)
+        if not (actual in value if operator == 'in' else actual == value):
+            return False
+    return True
+
+
+# Holds TABLE once it has been seen. Only a hit is remembered: a worker that
+# looked before migrate built the index has to find it on a later look.
+_built = set()
+
+
+def _ready():
+    if TABLE not in _built and TABLE in connection.introspection.table_names():
+        _built.add(TABLE)
+    return TABLE in _built
+
+
+def _create(cursor):
+    cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+    cursor.execute(
+        f'CREATE VIRTUAL TABLE {TABLE} USING fts5('
+        "title, body, kind UNINDEXED, slug UNINDEXED, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+
+
+def rebuild():
+    """Re-create the index from every visible document; returns the number indexed."""
+    count = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        _create(cursor)
+        for kind, (model_name, visible, title, body, _) in DOCUMENTS.items():
+            model = apps.get_model('kianvosite', model_name)
+            rows = [
+                (_rowid(kind, obj.pk), *_document(kind, obj), kind, obj.slug)
+                for obj in model.objects.filter(**visible).only('pk', 'slug', title, *body).iterator()
+            ]
+            cursor.executemany(f'INSERT INTO {TABLE} (rowid, title, body, kind, slug) VALUES (%s, %s, %s, %s, %s)', rows)
+            count += len(rows)
+    _built.add(TABLE)
+    return count
+
+
+def sync_schema():
+    if enabled() and not _ready():
+        rebuild()
+
+
+def index(instance):
+    """Add, update or (if it is no longer visible) remove one document."""
+    kind = _kind(type(instance))
+    if kind is None or not enabled() or not _ready():
+        return
+    rowid = _rowid(kind, instance.pk)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [rowid])
+        if _visible(kind, instance):
+            cursor.execute(
+                f'INSERT INTO {TABLE} (rowid, title, body, kind, slug) VALUES (%s, %s, %s, %s, %s)',
+                [rowid, *_document(kind, instance), kind, instance.slug],
+            )
+
+
+def unindex(model, pk):
+    kind = _kind(model)
+    if kind is None or not enabled() or not _ready():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [_rowid(kind, pk)])
+
+
+def _marked(text):
+    return mark_safe(escape(text).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+def _result(kind, slug, title, snippet):
+    return {
+        'kind': kind,
+        'label': LABELS[kind],
+        'url': reverse(DOCUMENTS[kind][4], args=[slug]),
+        'title': title,
+        'snippet': snippet,
+    }
+
+
+def _fallback(query):
+    results = []
+    for kind, (model_name, visible, title, body, _) in DOCUMENTS.items():
+        model = apps.get_model('kianvosite', model_name)
+        q = Q()
+        for field in (title, *body):
+            q |= Q(**{f'{field}__icontains': query})
+        for obj in model.objects.filter(q, **visible).only('pk', 'slug', title, *body)[:MAX_RESULTS]:
+            text_title, text_body = _document(kind, obj)
+            results.append(_result(kind, obj.slug, text_title, Truncator(text_body).words(30)))
+    return results[:MAX_RESULTS]
+
+
+def search(query):
+    """
+    The best MAX_RESULTS matches for ``query``, as dicts of kind, label, url,
+    title and snippet (the last two HTML-safe, with matches in <mark>).
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return []
+    if not enabled() or not _ready():
+        return _fallback(query)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT kind, slug, highlight({TABLE}, 0, %s, %s), snippet({TABLE}, 1, %s, %s, '…', 32) "
+            f'FROM {TABLE} WHERE {TABLE} MATCH %s ORDER BY bm25({TABLE}, %s, 1.0) LIMIT %s',
+            [MARK_START, MARK_END, MARK_START, MARK_END, expression, TITLE_WEIGHT, MAX_RESULTS],
+        )
+        rows = cursor.fetchall()
+    return [_result(kind, slug, _marked(title), _marked(snippet)) for kind, slug, title, snippet in rows]
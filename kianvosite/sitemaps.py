@@ -23,7 +23,7 @@ class ProjectSitemap(Sitemap):
     priority = 0.8
 
     def items(self):
-        return Project.objects.filter(is_active=True)
+        return Project.objects.filter(is_active=True).only('slug', 'updated_at')
 
     def lastmod(self, obj):
         return obj.updated_at
@@ -37,18 +37,21 @@ class ServiceSitemap(Sitemap):
     priority = 0.7
 
     def items(self):
-        return Service.objects.filter(is_active=True)
+        return Service.objects.filter(is_active=True).only('slug', 'updated_at')
 
     def lastmod(self, obj):
         return obj.updated_at
 
+    def location(self, obj):
+        return f'/services/{obj.slug}/'
+
 
 class BlogSitemap(Sitemap):
     changefreq = 'weekly'
     priority = 0.8
 
     def items(self):
-        return BlogPost.objects.filter(is_published=True)
+        return BlogPost.objects.filter(is_published=True).only('slug', 'updated_at', 'published_date')
 
     def lastmod(self, obj):
         return obj.updated_at if hasattr(obj, 'updated_at') else obj.published_date
@@ -62,7 +65,7 @@ class AnnouncementSitemap(Sitemap):
     priority = 0.6
 
     def items(self):
-        return Announcement.objects.filter(is_active=True)
+        return Announcement.objects.filter(is_active=True, status__in=['open', 'closed']).only('slug', 'updated_at')
 
     def lastmod(self, obj):
         return obj.updated_at if hasattr(obj, 'updated_at') else obj.created_at
@@ -0,0 +1,42 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from ..images import srcsets
+
+register = template.Library()
+
+
+def _derivative(context, source):
+    """
+    (digest, width, widths) for ``source`` from the map the view built with
+    images.prefetch_derivatives(), or None: not processed yet, or not
+    prefetched, in which case the tag renders a plain <img>.
+    """
+    found = getattr(context.get('request'), '_image_derivatives', None) or {}
+    return found.get(source)
+
+
+@register.simple_tag(takes_context=True)
+def responsive_image(context, image, sizes='100vw', **attrs):
+    """
+    Render ``image`` (an ImageField value) as a <picture> with a WebP srcset
+    and an original-format srcset, falling back to a plain <img> until its
+    derivatives exist. Extra keyword arguments become <img> attributes:
+
+        {% responsive_image post.featured_image sizes="(min-width: 992px) 33vw, 100vw" alt=post.title loading="lazy" %}
+    """
+    if not image:
+        return ''
+    extra = format_html_join('', ' {}="{}"', attrs.items())
+    entry = _derivative(context, image.name)
+    if entry is None:
+        return format_html('<img src="{}"{}>', image.url, extra)
+
+    webp, original = srcsets(image, entry)
+    return format_html(
+        '<picture class="ks-picture">'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}>'
+        '</picture>',
+        webp, sizes, image.url, original, sizes, extra,
+    )
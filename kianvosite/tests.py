@@ -1,3 +1,917 @@
-from django.test import TestCase
+import base64
+import datetime
+import json
+import os
+import re
+import shutil
+import tempfile
+import warnings
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib import admin, messages
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core import mail
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import escape
+from PIL import ExifTags, Image
+
+from . import portal_search, site_search
+from .caching import bump_version, cache_anonymous_page, cached_section, purge_pages
+from .counters import recount
+from .images import build_derivatives, record_derivatives
+from .jobs import claim, requeue_stale
+from .management.commands import process_media_jobs
+from .newsletter import Campaign, unsubscribe_email, unsubscribe_token
+from .pagination import keyset_page
+from .portal_views import EstimatedPaginator
+from .models import (
+    ProjectCategory, Project, Service, Testimonial, BlogCategory, BlogPost,
+    ContactInquiry, NewsletterSubscriber, CompanyStat, Partner, TeamMember,
+    ProductImage, SocialLink, GalleryCategory, GalleryImage, Announcement,
+    AnnouncementApplication, HeroSlide, ActiveProduct, ImageDerivative, MediaJob, Broadcast, DeliveryAttempt, EmailOutbox,
+)
+from .signals import PAGE_DEPENDENCIES, pages_showing
+from .views import BLOG_ORDERING, GALLERY_ORDERING, PAGE_SIZE
+
+
+class PublicPageQueryCountTests(TestCase):
+    """
+    Public pages must run the same number of queries however many rows they
+    list, from a cold cache. Every image has its own file name, so per-image
+    lookups cannot hide behind a shared one.
+    """
+
+    URLS = [
+        '/', '/about/', '/portfolio/', '/products/', '/blog/', '/gallery/',
+        '/testimonials/', '/portfolio/project-0/', '/blog/post-0/',
+    ]
+
+    def setUp(self):
+        self.project_category = ProjectCategory.objects.create(name='Apps', slug='apps', icon_class='x')
+        self.blog_category = BlogCategory.objects.create(name='News', slug='news')
+        self.gallery_category = GalleryCategory.objects.create(name='Bootcamps', slug='bootcamps')
+        self.seeded = 0
+
+    def seed(self, count):
+        for i in range(self.seeded, self.seeded + count):
+            project = Project.objects.create(
+                name=f'Project {i}', slug=f'project-{i}', tagline='t', description='d',
+                technologies='Django', category=self.project_category, is_featured=True,
+            )
+            ProductImage.objects.create(project=project, image=f'projects/screenshots/{i}.png', is_featured=True)
+            Testimonial.objects.create(client_name=f'Client {i}', content='Great', project=project)
+            BlogPost.objects.create(
+                title=f'Post {i}', slug=f'post-{i}', excerpt='e', content='<p>Body</p>',
+                category=self.blog_category, featured_image=f'blog/{i}.png',
+            )
+            GalleryImage.objects.create(title=f'Image {i}', image=f'gallery/{i}.png', category=self.gallery_category)
+        self.seeded += count
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries)
+
+    def test_query_count_is_constant(self):
+        self.seed(2)
+        small = {url: self.count_queries(url) for url in self.URLS}
+        self.seed(10)
+        for url in self.URLS:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), small[url])
+
+
+class AdminChangelistQueryBudgetTests(TestCase):
+    """Every admin change list must stay within a fixed query budget with 1,000 rows per model."""
+
+    ROWS = 1000
+    # Session, user, counts, the page of rows and list_filter choices; never one per row
+    QUERY_BUDGET = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        today = datetime.date.today()
+        n = range(cls.ROWS)
+        # bulk_create skips signals, which is all the seeding needs
+        project_categories = ProjectCategory.objects.bulk_create(
+            ProjectCategory(name=f'Category {i}', slug=f'category-{i}', icon_class='x') for i in n)
+        blog_categories = BlogCategory.objects.bulk_create(BlogCategory(name=f'News {i}', slug=f'news-{i}') for i in n)
+        gallery_categories = GalleryCategory.objects.bulk_create(
+            GalleryCategory(name=f'Bootcamps {i}', slug=f'bootcamps-{i}') for i in n)
+        projects = Project.objects.bulk_create(
+            Project(name=f'Project {i}', slug=f'project-{i}', tagline='t', description='d', technologies='Django',
+                    category=project_categories[i]) for i in n)
+        announcements = Announcement.objects.bulk_create(
+            Announcement(title=f'Bootcamp {i}', slug=f'bootcamp-{i}', short_description='s', description='d',
+                         start_date=today, application_deadline=today) for i in n)
+        Service.objects.bulk_create(Service(name=f'Service {i}', slug=f'service-{i}', short_description='s',
+                                            description='d') for i in n)
+        Testimonial.objects.bulk_create(Testimonial(client_name=f'Client {i}', content='c', project=projects[i]) for i in n)
+        BlogPost.objects.bulk_create(BlogPost(title=f'Post {i}', slug=f'post-{i}', excerpt='e', content='c',
+                                              category=blog_categories[i]) for i in n)
+        ContactInquiry.objects.bulk_create(ContactInquiry(name=f'N {i}', email='a@example.com', message='m') for i in n)
+        NewsletterSubscriber.objects.bulk_create(NewsletterSubscriber(email=f's{i}@example.com') for i in n)
+        CompanyStat.objects.bulk_create(CompanyStat(name=f'Stat {i}', value=i) for i in n)
+        Partner.objects.bulk_create(Partner(name=f'Partner {i}', logo='partners/x.png') for i in n)
+        TeamMember.objects.bulk_create(TeamMember(name=f'Member {i}', role='r') for i in n)
+        ProductImage.objects.bulk_create(ProductImage(project=projects[i], image='projects/screenshots/x.png') for i in n)
+        SocialLink.objects.bulk_create(SocialLink(platform=f'Site {i}', url='https://example.com', icon_class='x') for i in n)
+        GalleryImage.objects.bulk_create(GalleryImage(title=f'Image {i}', image='gallery/x.png',
+                                                      category=gallery_categories[i]) for i in n)
+        AnnouncementApplication.objects.bulk_create(AnnouncementApplication(
+            announcement=announcements[i], full_name=f'Applicant {i}', email='a@example.com', phone='1',
+            motivation='m') for i in n)
+        HeroSlide.objects.bulk_create(HeroSlide(title=f'Slide {i}') for i in n)
+        ActiveProduct.objects.bulk_create(ActiveProduct(name=f'Product {i}', short_description='s',
+                                                        project=projects[i]) for i in n)
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def test_changelists_stay_within_budget(self):
+        self.client.force_login(self.user)
+        for model in admin.site._registry:
+            if model._meta.app_label != 'kianvosite':
+                continue
+            url = reverse(f'admin:kianvosite_{model._meta.model_name}_changelist')
+            with self.subTest(model=model.__name__):
+                self.assertEqual(model.objects.count(), self.ROWS)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(len(queries), self.QUERY_BUDGET, '\n'.join(q['sql'] for q in queries))
+
+
+class CounterTests(TestCase):
+    """Signals keep the denormalised child counts in step; `recount` repairs drift."""
+
+    def setUp(self):
+        self.apps = ProjectCategory.objects.create(name='Apps', slug='apps', icon_class='x')
+        self.sites = ProjectCategory.objects.create(name='Sites', slug='sites', icon_class='x')
+
+    def create_project(self, i, category):
+        return Project.objects.create(
+            name=f'Project {i}', slug=f'project-{i}', tagline='t', description='d', technologies='Django',
+            category=category,
+        )
+
+    def assertCounts(self, apps, sites):
+        self.apps.refresh_from_db()
+        self.sites.refresh_from_db()
+        self.assertEqual((self.apps.project_count, self.sites.project_count), (apps, sites))
+
+    def test_create(self):
+        self.create_project(0, self.apps)
+        self.create_project(1, self.apps)
+        self.create_project(2, None)
+        self.assertCounts(2, 0)
+
+    def test_move_between_parents(self):
+        project = self.create_project(0, self.apps)
+        project.category = self.sites
+        project.save()
+        self.assertCounts(0, 1)
+        project.category = None
+        project.save()
+        self.assertCounts(0, 0)
+
+    def test_delete(self):
+        self.create_project(0, self.apps)
+        self.create_project(1, self.apps).delete()
+        self.assertCounts(1, 0)
+
+    def test_delete_with_drifted_counter_stops_at_zero(self):
+        project = self.create_project(0, self.apps)
+        ProjectCategory.objects.update(project_count=0)
+        project.delete()
+        self.assertCounts(0, 0)
+
+    def test_recount(self):
+        self.create_project(0, self.apps)
+        self.create_project(1, self.apps)
+        ProjectCategory.objects.update(project_count=5)
+        corrected = recount()
+        self.assertEqual(corrected['project_count'], 2)
+        self.assertEqual(corrected['post_count'], 0)
+        self.assertCounts(2, 0)
+        self.assertEqual(recount()['project_count'], 0)
+
+
+class CachedSectionTests(TestCase):
+    """Sections keyed on many models keep cache keys every backend accepts."""
+
+    def test_many_models_stay_within_the_key_limit(self):
+        models = list(apps.get_app_config('kianvosite').get_models())
+        builder = mock.Mock(return_value=[1])
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            with mock.patch('kianvosite.caching.cache.get_many', wraps=cache.get_many) as get_many:
+                self.assertEqual(cached_section('test', 'all', models, builder), [1])
+            self.assertEqual(cached_section('test', 'all', models, builder), [1])
+            self.assertEqual(builder.call_count, 1)
+
+            bump_version(models[-1])
+            cached_section('test', 'all', models, builder)
+            self.assertEqual(builder.call_count, 2)
+        [section_key] = get_many.call_args_list[-1].args[0]
+        self.assertLessEqual(len(section_key), 250)
+
+
+class CampaignTests(TestCase):
+    """Campaign.render() splices each recipient's address and unsubscribe link into the pre-split bodies."""
+
+    def test_render_fills_personal_fields(self):
+        personal = Campaign.placeholders()
+        campaign = Campaign(
+            'Subject', f'To {personal["email"]}: {personal["unsubscribe_url"]}',
+            f'<a href="{personal["unsubscribe_url"]}">{personal["email"]}</a>',
+        )
+        values = campaign.personal_values('a&b@example.com')
+        text, html = campaign.render(values)
+        url = values['unsubscribe_url']
+        self.assertIn('/newsletter/unsubscribe/', url)
+        self.assertEqual(unsubscribe_email(url.rstrip('/').rsplit('/', 1)[1]), 'a&b@example.com')
+        self.assertEqual(text, f'To a&b@example.com: {url}')
+        self.assertEqual(html, f'<a href="{escape(url)}">a&amp;b@example.com</a>')
+
+    def test_unknown_placeholder_is_kept_as_text(self):
+        campaign = Campaign('Subject', 'Use [[kv:promo]] at [[kv:email]]', '<p>[[kv:promo]]</p>')
+        text, html = campaign.render(campaign.personal_values('a@example.com'))
+        self.assertEqual(text, 'Use [[kv:promo]] at a@example.com')
+        self.assertEqual(html, '<p>[[kv:promo]]</p>')
+
+    def test_text_without_placeholders(self):
+        campaign = Campaign('Subject', 'Plain text')
+        self.assertEqual(campaign.render(campaign.personal_values('a@example.com')), ('Plain text', ''))
+
+
+class NewsletterResubscribeTests(TestCase):
+    """A lapsed address is only turned back on from the confirmation link mailed to it."""
+
+    def setUp(self):
+        cache.clear()
+        self.subscriber = NewsletterSubscriber.objects.create(email='lapsed@example.com', is_active=False)
+
+    def subscribe(self):
+        return self.client.post(reverse('subscribe_newsletter'), {'email': 'lapsed@example.com'}).json()
+
+    def test_subscribing_mails_a_link_instead_of_reactivating(self):
+        self.assertTrue(self.subscribe()['success'])
+        self.subscribe()
+        self.subscriber.refresh_from_db()
+        self.assertFalse(self.subscriber.is_active)
+
+        # One confirmation per hour, however often the form is sent
+        [outbox] = EmailOutbox.objects.all()
+        self.assertEqual(outbox.to, ['lapsed@example.com'])
+        link = re.search(r'https?://\S+(/newsletter/resubscribe/\S+/)', outbox.body_text)[1]
+
+        self.assertEqual(self.client.get(link).status_code, 200)
+        self.subscriber.refresh_from_db()
+        self.assertFalse(self.subscriber.is_active)
+
+        self.client.post(link)
+        self.subscriber.refresh_from_db()
+        self.assertTrue(self.subscriber.is_active)
+
+    def test_forged_link_is_rejected(self):
+        forged = reverse('newsletter_resubscribe', args=[unsubscribe_token('lapsed@example.com')])
+        self.assertEqual(self.client.post(forged).status_code, 404)
+        self.subscriber.refresh_from_db()
+        self.assertFalse(self.subscriber.is_active)
+
+
+class PortalSearchTests(TestCase):
+    """Portal search goes through the FTS5 index, which signals keep in step with saves and deletes."""
+
+    def create_project(self, slug, name, description='d'):
+        return Project.objects.create(
+            name=name, slug=slug, tagline='t', description=description, technologies='Django',
+        )
+
+    def search(self, query):
+        qs = portal_search.search(Project.objects.all(), query, ['name', 'tagline', 'description'])
+        self.assertIn('search_rank', qs.query.annotations)
+        return [p.slug for p in qs.order_by('search_rank', '-id')]
+
+    def test_insert_update_delete(self):
+        one = self.create_project('one', 'Clinic dashboard', 'A dashboard for clinics, dashboard first')
+        self.create_project('two', 'School portal', 'Has a dashboard')
+        self.create_project('three', 'Billing', 'Invoices')
+        self.assertEqual(self.search('dash'), ['one', 'two'])
+        # Word prefixes only, unlike the icontains fallback
+        self.assertEqual(self.search('board'), [])
+
+        one.description = 'Appointments'
+        one.name = 'Clinic'
+        one.save()
+        self.assertEqual(self.search('dash'), ['two'])
+        self.assertEqual(self.search('appoint'), ['one'])
+
+        Project.objects.get(slug='two').delete()
+        self.assertEqual(self.search('dash'), [])
+
+    def test_table_built_after_a_miss_is_found(self):
+        fts = f'{Project._meta.db_table}_fts'
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {fts}')
+        portal_search._built.discard(fts)
+        self.assertFalse(portal_search._indexed(Project))
+
+        # Built by another process: this one never called rebuild()
+        portal_search.rebuild(Project)
+        portal_search._built.discard(fts)
+        self.create_project('one', 'Clinic dashboard')
+        self.assertEqual(self.search('dash'), ['one'])
+
+
+class SiteSearchTests(TestCase):
+    """/search/ covers what visitors can see of every indexed kind, with escaped highlights."""
+
+    def setUp(self):
+        today = datetime.date.today()
+        Project.objects.create(name='Rocket project', slug='rocket-app', tagline='t', description='d', technologies='x')
+        Service.objects.create(name='Rocket service', slug='rocket-service', short_description='s', description='d')
+        BlogPost.objects.create(title='Rocket post', slug='rocket-post', excerpt='e', content='<p>Body</p>')
+        BlogPost.objects.create(title='Rocket draft', slug='rocket-draft', excerpt='e', content='c', is_published=False)
+        for status in ('draft', 'open', 'closed'):
+            Announcement.objects.create(
+                title=f'Rocket {status}', slug=f'rocket-{status}', short_description='s', description='d',
+                start_date=today, application_deadline=today, status=status,
+            )
+
+    def urls(self, query):
+        return sorted(result['url'] for result in site_search.search(query))
+
+    def test_visible_documents_of_every_kind(self):
+        self.assertEqual(self.urls('rocket'), [
+            '/announcements/rocket-closed/', '/announcements/rocket-open/', '/blog/rocket-post/',
+            '/portfolio/rocket-app/', '/services/rocket-service/',
+        ])
+
+    def test_hidden_documents_leave_the_index(self):
+        post = BlogPost.objects.get(slug='rocket-post')
+        post.is_published = False
+        post.save()
+        announcement = Announcement.objects.get(slug='rocket-open')
+        announcement.status = 'draft'
+        announcement.save()
+        self.assertNotIn('/blog/rocket-post/', self.urls('rocket'))
+        self.assertNotIn('/announcements/rocket-open/', self.urls('rocket'))
+
+        announcement.status = 'open'
+        announcement.save()
+        self.assertIn('/announcements/rocket-open/', self.urls('rocket'))
+
+    def test_every_result_and_sitemap_url_renders(self):
+        urls = self.urls('rocket')
+        self.assertIn('/services/rocket-service/', urls)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+        sitemap = self.client.get(reverse('sitemap')).content.decode()
+        for url in urls:
+            self.assertIn(url, sitemap)
+        self.assertNotIn('/announcements/rocket-draft/', sitemap)
+        self.assertNotIn('/blog/rocket-draft/', sitemap)
+
+    def test_highlight_and_snippet_are_escaped(self):
+        Project.objects.create(
+            name='Nebula & "Sons"', slug='nebula', tagline='if a < b then nebula', description='d',
+            technologies='x',
+        )
+        [result] = site_search.search('nebula')
+        self.assertEqual(result['title'], '<mark>Nebula</mark> &amp; &quot;Sons&quot;')
+        self.assertIn('if a &lt; b then <mark>nebula</mark>', result['snippet'])
+
+    def test_table_built_after_a_miss_is_found(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {site_search.TABLE}')
+        site_search._built.discard(site_search.TABLE)
+        self.assertFalse(site_search._ready())
+
+        # Built by another process: this one never called rebuild()
+        site_search.rebuild()
+        site_search._built.discard(site_search.TABLE)
+        Service.objects.create(name='Comet service', slug='comet', short_description='s', description='d')
+        self.assertEqual(self.urls('comet'), ['/services/comet/'])
+
+
+class PortalCountTests(TestCase):
+    """Unfiltered portal lists over a large table page with a cached count, never past the last row."""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        Partner.objects.bulk_create(Partner(name=f'Partner {i}', logo='partners/x.png') for i in range(45))
+        cache.clear()
+
+    def list_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # Counts of the listed table, not the sidebar stats
+        return response, [
+            q['sql'] for q in queries
+            if ('COUNT(' in q['sql'] or 'MAX(' in q['sql']) and 'UNION' not in q['sql'] and 'kianvosite_partner' in q['sql']
+        ]
+
+    def test_small_table_counts_once(self):
+        self.list_queries('/portal/partners/')
+        response, counts = self.list_queries('/portal/partners/')
+        self.assertEqual(len(counts), 1)
+        self.assertFalse(response.context['count_is_estimate'])
+        self.assertEqual(response.context['total_count'], 45)
+
+    def test_large_table_uses_cached_count(self):
+        with self.settings(PORTAL_ESTIMATE_COUNT_ABOVE=10):
+            self.list_queries('/portal/partners/')
+            response, counts = self.list_queries('/portal/partners/')
+        self.assertEqual(counts, [])
+        self.assertTrue(response.context['count_is_estimate'])
+        self.assertEqual(response.context['total_count'], 45)
+
+    def test_overestimate_is_clamped(self):
+        qs = Partner.objects.order_by('pk')
+        page = EstimatedPaginator(qs, 20, 100).get_page(5)
+        self.assertEqual(page.number, 3)
+        self.assertEqual(len(page.object_list), 5)
+        self.assertEqual((page.paginator.count, page.paginator.num_pages), (45, 3))
+        self.assertFalse(page.has_next())
+
+        # A short page shows where the table ends without counting
+        with CaptureQueriesContext(connection) as queries:
+            page = EstimatedPaginator(qs, 20, 100).get_page(3)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual((page.paginator.count, page.paginator.num_pages), (45, 3))
+
+
+class KeysetPaginationTests(TestCase):
+    """?after= cursors walk every row exactly once, in order, and never 500 on a bad cursor."""
+
+    def setUp(self):
+        self.category = GalleryCategory.objects.create(name='Bootcamps', slug='bootcamps')
+
+    def create_images(self, dates):
+        return [
+            GalleryImage.objects.create(title=f'Image {i}', image=f'gallery/{i}.png', category=self.category, event_date=d)
+            for i, d in enumerate(dates)
+        ]
+
+    def walk(self, queryset, ordering, per_page):
+        seen, after = [], None
+        while True:
+            page = keyset_page(queryset, ordering, after, per_page)
+            seen += [row.pk for row in page.items]
+            if not page.has_next:
+                return seen
+            after = page.next_cursor
+
+    def test_ties_are_broken_by_pk(self):
+        self.create_images([datetime.date(2024, 1, 1)] * 7)
+        seen = self.walk(GalleryImage.objects.all(), GALLERY_ORDERING, 2)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+        self.assertEqual(len(seen), 7)
+
+    def test_null_dates_sort_last(self):
+        day = datetime.date(2024, 1, 1)
+        images = self.create_images([None, day, None, day + datetime.timedelta(days=1), None])
+        seen = self.walk(GalleryImage.objects.all(), GALLERY_ORDERING, 2)
+        expected = [images[3].pk, images[1].pk, images[4].pk, images[2].pk, images[0].pk]
+        self.assertEqual(seen, expected)
+
+    def test_equal_published_dates(self):
+        when = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        posts = [
+            BlogPost.objects.create(title=f'Post {i}', slug=f'post-{i}', excerpt='e', content='c', published_date=when)
+            for i in range(5)
+        ]
+        seen = self.walk(BlogPost.objects.all(), BLOG_ORDERING, 2)
+        self.assertEqual(seen, [post.pk for post in reversed(posts)])
+
+    def test_bad_cursor_gives_the_first_page(self):
+        self.create_images([None] * 3)
+        first = list(self.client.get('/gallery/').context['images'])
+        tampered = base64.urlsafe_b64encode(json.dumps(['x', 'y', 'z', 'w']).encode()).decode()
+        for after in ['garbage', '!!!', tampered, base64.urlsafe_b64encode(b'{"a": 1}').decode()]:
+            with self.subTest(after=after):
+                cache.clear()
+                response = self.client.get('/gallery/', {'after': after})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(list(response.context['images']), first)
+                self.assertEqual(self.client.get('/gallery/feed/', {'after': after}).status_code, 200)
+
+    def test_last_page_has_no_load_more(self):
+        self.create_images([None] * (PAGE_SIZE + 1))
+        response = self.client.get('/gallery/')
+        self.assertContains(response, 'id="ksGalleryMore"')
+        after = response.context['next_cursor']
+        response = self.client.get('/gallery/', {'after': after})
+        self.assertEqual(len(response.context['images']), 1)
+        self.assertNotContains(response, 'id="ksGalleryMore"')
+
+        feed = self.client.get('/gallery/feed/', {'after': after}).json()
+        self.assertEqual((len(feed['images']), feed['next']), (1, None))
+
+    def test_feed_matches_the_rendered_srcsets(self):
+        [image] = self.create_images([None])
+        feed = self.client.get('/gallery/feed/').json()
+        self.assertEqual((feed['images'][0]['srcset'], feed['images'][0]['webp_srcset']), ('', ''))
+
+        record_derivatives(image.image.name, {'digest': 'abc123', 'width': 800, 'widths': [320, 640]})
+        cache.clear()
+        card = self.client.get('/gallery/feed/').json()['images'][0]
+        page = self.client.get('/gallery/').content.decode()
+        self.assertIn('gallery/0.abc123.320w.webp 320w', card['webp_srcset'])
+        self.assertIn('gallery/0.abc123.640w.png 640w', card['srcset'])
+        self.assertIn(f'srcset="{card["webp_srcset"]}"', page)
+        self.assertIn(f'srcset="{card["srcset"]}"', page)
+
+
+class ServeMediaTests(TestCase):
+    """/media/ honours single byte ranges and conditional GETs, and never leaves MEDIA_ROOT."""
+
+    DATA = bytes(range(100))
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root, MEDIA_SENDFILE=''))
+        os.makedirs(os.path.join(media_root, 'gallery'))
+        for name in ('gallery/a.bin', 'gallery/a.0123456789ab.640w.webp'):
+            with open(os.path.join(media_root, name), 'wb') as fh:
+                fh.write(self.DATA)
+        with open(os.path.join(os.path.dirname(media_root), 'outside.txt'), 'w') as fh:
+            self.addCleanup(os.remove, fh.name)
+
+    def get(self, path='/media/gallery/a.bin', **headers):
+        response = self.client.get(path, **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_whole_file(self):
+        response, body = self.get()
+        self.assertEqual((response.status_code, body), (200, self.DATA))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+
+    def test_first_bytes(self):
+        response, body = self.get(HTTP_RANGE='bytes=0-9')
+        self.assertEqual((response.status_code, body), (206, self.DATA[:10]))
+        self.assertEqual(response['Content-Range'], 'bytes 0-9/100')
+        self.assertEqual(response['Content-Length'], '10')
+
+    def test_suffix_range(self):
+        response, body = self.get(HTTP_RANGE='bytes=-5')
+        self.assertEqual((response.status_code, body), (206, self.DATA[-5:]))
+        self.assertEqual(response['Content-Range'], 'bytes 95-99/100')
+
+    def test_unsatisfiable_range(self):
+        response, _ = self.get(HTTP_RANGE='bytes=100-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+
+    def test_stale_if_range_gets_the_whole_file(self):
+        etag = self.get()[0]['ETag']
+        response, body = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual((response.status_code, body), (200, self.DATA))
+        response, body = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual((response.status_code, body), (206, self.DATA[:10]))
+
+    def test_if_none_match(self):
+        etag = self.get()[0]['ETag']
+        response, body = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, body), (304, b''))
+
+    def test_hashed_names_are_immutable(self):
+        response, _ = self.get('/media/gallery/a.0123456789ab.640w.webp')
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    def test_path_traversal(self):
+        for path in ['/media/../outside.txt', '/media/gallery/../../outside.txt', '/media/%2e%2e/outside.txt',
+                     '/media/gallery/', '/media/missing.bin']:
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path).status_code, 404)
+
+
+class PageCacheTests(TestCase):
+    """Anonymous GETs are served from the page cache until a model the page shows is written."""
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def view(self, request):
+        self.calls += 1
+        return HttpResponse(f'{request.GET.get("category")}|{request.GET.get("after")}')
+
+    def request(self, view, path='/x/', method='get', user=None, **params):
+        request = getattr(RequestFactory(), method)(path, params)
+        request.user = user or AnonymousUser()
+        request._messages = CookieStorage(request)
+        return view(request)
+
+    def queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_second_anonymous_get_runs_no_queries(self):
+        self.assertGreater(self.queries('/about/'), 0)
+        self.assertEqual(self.queries('/about/'), 0)
+
+    def test_logged_in_post_and_message_requests_bypass_the_cache(self):
+        view = cache_anonymous_page(self.view)
+        user = User.objects.create_user('staff', 'staff@example.com', 'password')
+        for _ in range(2):
+            self.request(view, user=user)
+            self.request(view, method='post')
+        self.assertEqual(self.calls, 4)
+
+        request = RequestFactory().get('/x/')
+        request.user = AnonymousUser()
+        request._messages = CookieStorage(request)
+        messages.info(request, 'Saved')
+        view(request)
+        self.assertEqual(self.calls, 5)
+        self.request(view)
+        self.request(view)
+        self.assertEqual(self.calls, 6)
+
+    def test_responses_that_set_cookies_are_not_stored(self):
+        def view(request):
+            response = self.view(request)
+            response.set_cookie('seen', '1')
+            return response
+
+        view = cache_anonymous_page(view)
+        self.request(view)
+        self.request(view)
+        self.assertEqual(self.calls, 2)
+
+    def test_listed_params_split_the_cache_and_others_do_not(self):
+        view = cache_anonymous_page(params=('category', 'after'))(self.view)
+        self.assertEqual(self.request(view, category='a').content, b'a|None')
+        self.assertEqual(self.request(view, category='b').content, b'b|None')
+        self.assertEqual(self.request(view, category='a', after='x').content, b'a|x')
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(self.request(view, category='a', utm_source='mail').content, b'a|None')
+        self.assertEqual(self.request(view, category='b', fbclid='1').content, b'b|None')
+        self.assertEqual(self.calls, 3)
+
+    def test_a_write_purges_only_the_pages_that_show_the_model(self):
+        category = BlogCategory.objects.create(name='News', slug='news')
+        for url in ('/blog/', '/testimonials/'):
+            self.queries(url)
+            self.assertEqual(self.queries(url), 0)
+
+        self.assertIn('/blog/', PAGE_DEPENDENCIES['BlogCategory'])
+        self.assertNotIn('/testimonials/', PAGE_DEPENDENCIES['BlogCategory'])
+        category.name = 'Updates'
+        category.save()
+        self.assertGreater(self.queries('/blog/'), 0)
+        self.assertEqual(self.queries('/testimonials/'), 0)
+
+    def test_if_none_match_gives_304(self):
+        response = self.client.get('/about/')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/about/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        # A write to a model shown on the page changes the ETag
+        etag = response['ETag']
+        TeamMember.objects.create(name='New', role='r')
+        response = self.client.get('/about/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class MediaJobPageTests(TestCase):
+    """Processing images purges only the page sections that can show them, once per batch."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+        os.makedirs(os.path.join(media_root, 'gallery'))
+        Image.new('RGB', (800, 600), 'teal').save(os.path.join(media_root, 'gallery', 'class.png'))
+        cache.clear()
+
+    def queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return len(queries)
+
+    def test_processing_purges_only_the_pages_showing_the_image(self):
+        self.assertEqual(pages_showing(['gallery/class.png']), {'/gallery/'})
+        category = GalleryCategory.objects.create(name='Bootcamps', slug='bootcamps')
+        GalleryImage.objects.create(title='Class', image='gallery/class.png', category=category)
+        for url in ('/gallery/', '/testimonials/'):
+            self.queries(url)
+            self.assertEqual(self.queries(url), 0)
+
+        with mock.patch('kianvosite.management.commands.process_media_jobs.purge_pages', wraps=purge_pages) as purge:
+            call_command('process_media_jobs', workers=1, stdout=StringIO())
+        purge.assert_called_once_with('/gallery/')
+
+        self.assertTrue(ImageDerivative.objects.filter(source='gallery/class.png').exists())
+        self.assertIn(b'<picture', self.client.get('/gallery/').content)
+        self.assertEqual(self.queries('/testimonials/'), 0)
+
+
+class StripMetadataTests(TestCase):
+    """build_derivatives() strips EXIF from originals without re-encoding files it need not touch."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.enterContext(self.settings(MEDIA_ROOT=self.root))
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def read(self, name):
+        with open(self.path(name), 'rb') as fh:
+            return fh.read()
+
+    def test_jpeg_loses_exif_but_keeps_its_quantisation(self):
+        exif = Image.Exif()
+        exif[ExifTags.Base.Make] = 'Camera'
+        Image.new('RGB', (700, 500), 'red').save(self.path('photo.jpg'), quality=95, exif=exif.tobytes())
+        tables = Image.open(self.path('photo.jpg')).quantization
+
+        build_derivatives('photo.jpg')
+        stripped = Image.open(self.path('photo.jpg'))
+        self.assertNotIn('exif', stripped.info)
+        self.assertEqual(stripped.quantization, tables)
+        self.assertEqual([name for name in os.listdir(self.root) if name.startswith('.')], [])
+
+    def test_files_without_metadata_and_animations_are_left_alone(self):
+        Image.new('RGB', (400, 300)).save(self.path('plain.png'))
+        exif = Image.Exif()
+        exif[ExifTags.Base.Make] = 'Camera'
+        frames = [Image.new('RGB', (400, 300), colour) for colour in ('red', 'blue')]
+        frames[0].save(self.path('anim.gif'), save_all=True, append_images=frames[1:], exif=exif.tobytes())
+
+        for name in ('plain.png', 'anim.gif'):
+            with self.subTest(name=name):
+                before = self.read(name)
+                build_derivatives(name)
+                self.assertEqual(self.read(name), before)
+        self.assertEqual(Image.open(self.path('anim.gif')).n_frames, 2)
+
+
+class JobQueueTests(TestCase):
+    """Claiming, stale-lease recovery and retry backoff of the database-backed queues."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+
+    def test_claim_skips_jobs_another_worker_holds(self):
+        held = MediaJob.objects.create(source='held.png', status='running', attempts=1)
+        waiting = [MediaJob.objects.create(source=f'waiting-{i}.png') for i in range(2)]
+        later = MediaJob.objects.create(source='later.png', run_after=timezone.now() + datetime.timedelta(hours=1))
+
+        claimed = claim(MediaJob, 10)
+        self.assertCountEqual([job.pk for job in claimed], [job.pk for job in waiting])
+        self.assertTrue(all(job.status == 'running' and job.attempts == 1 for job in claimed))
+        self.assertEqual(claim(MediaJob, 10), [])
+        held.refresh_from_db()
+        later.refresh_from_db()
+        self.assertEqual((held.status, held.attempts), ('running', 1))
+        self.assertEqual((later.status, later.attempts), ('pending', 0))
+
+    def test_requeue_stale_after_the_lease_expires(self):
+        fresh = MediaJob.objects.create(source='fresh.png', status='running', attempts=1)
+        stale = MediaJob.objects.create(source='stale.png', status='running', attempts=1)
+        MediaJob.objects.filter(pk=stale.pk).update(updated_at=timezone.now() - datetime.timedelta(minutes=31))
+
+        self.assertEqual(requeue_stale(MediaJob, datetime.timedelta(minutes=30)), 1)
+        self.assertEqual([job.pk for job in claim(MediaJob, 10)], [stale.pk])
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, 'running')
+
+    def test_backoff_doubles_until_the_job_fails(self):
+        job = MediaJob.objects.create(source='missing.png')
+        delays = []
+        for _ in range(process_media_jobs.MAX_ATTEMPTS):
+            before = timezone.now()
+            call_command('process_media_jobs', workers=1, stdout=StringIO())
+            job.refresh_from_db()
+            if job.status == 'failed':
+                break
+            self.assertEqual(job.status, 'pending')
+            delays.append(round((job.run_after - before).total_seconds() / 60))
+            MediaJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+
+        base = process_media_jobs.RETRY_BASE_MINUTES
+        self.assertEqual(delays, [base * 2 ** i for i in range(process_media_jobs.MAX_ATTEMPTS - 1)])
+        self.assertEqual((job.status, job.attempts), ('failed', process_media_jobs.MAX_ATTEMPTS))
+        self.assertTrue(job.last_error)
+
+
+@override_settings(NEWSLETTER_BATCH_SIZE=2, NEWSLETTER_RATE=0)
+class SendBroadcastsTests(TestCase):
+    """send_broadcasts resumes an interrupted broadcast without mailing anyone twice."""
+
+    def setUp(self):
+        self.subscribers = [NewsletterSubscriber.objects.create(email=f'reader{i}@example.com') for i in range(5)]
+        NewsletterSubscriber.objects.create(email='gone@example.com', is_active=False)
+        post = BlogPost.objects.create(title='Launch', slug='launch', excerpt='Out now', content='<p>Hello</p>')
+        self.broadcast = Broadcast.objects.create(title='Launch', blog_post=post, total=5)
+
+    def test_connect_failure_resumes_from_the_last_batch(self):
+        opens = []
+
+        def open_second_batch_fails():
+            opens.append(True)
+            if len(opens) == 2:
+                raise OSError('connection refused')
+
+        with mock.patch.object(locmem.EmailBackend, 'open', side_effect=open_second_batch_fails):
+            with self.assertLogs('kianvosite.newsletter', 'ERROR'):
+                call_command('send_broadcasts', stdout=StringIO())
+            self.broadcast.refresh_from_db()
+            self.assertEqual(self.broadcast.status, 'pending')
+            self.assertEqual(self.broadcast.last_subscriber_id, self.subscribers[1].pk)
+            self.assertEqual(len(mail.outbox), 2)
+
+            Broadcast.objects.filter(pk=self.broadcast.pk).update(run_after=timezone.now())
+            call_command('send_broadcasts', stdout=StringIO())
+
+        self.broadcast.refresh_from_db()
+        self.assertEqual((self.broadcast.status, self.broadcast.sent, self.broadcast.failed), ('done', 5, 0))
+        recipients = [message.to[0] for message in mail.outbox]
+        self.assertEqual(sorted(recipients), sorted(s.email for s in self.subscribers))
+        deliveries = DeliveryAttempt.objects.filter(broadcast=self.broadcast)
+        self.assertCountEqual(deliveries.values_list('subscriber_id', flat=True), [s.pk for s in self.subscribers])
+        self.assertTrue(all(d.ok and d.smtp_code == 250 for d in deliveries))
+
+
+class BlogNavigationTests(TestCase):
+    """blog_detail's prev/next links follow publishing and re-dating through the cached post order."""
+
+    def setUp(self):
+        cache.clear()
+        self.category = BlogCategory.objects.create(name='News', slug='news')
+        now = timezone.now()
+        self.oldest, self.middle, self.newest = [
+            self.post(f'post-{i}', now - datetime.timedelta(days=3 - i)) for i in range(3)
+        ]
+
+    def post(self, slug, published_date, **fields):
+        return BlogPost.objects.create(
+            title=slug, slug=slug, excerpt='e', content='<p>Body</p>', category=self.category,
+            published_date=published_date, **fields,
+        )
+
+    def neighbours(self, post):
+        context = self.client.get(reverse('blog_detail', args=[post.slug])).context
+        return context['prev_post'], context['next_post']
+
+    def test_first_and_last_posts(self):
+        self.assertEqual(self.neighbours(self.newest), (self.middle, None))
+        self.assertEqual(self.neighbours(self.middle), (self.oldest, self.newest))
+        self.assertEqual(self.neighbours(self.oldest), (None, self.middle))
+
+    def test_publishing_unpublishing_and_redating_update_the_links(self):
+        self.neighbours(self.middle)
+        draft = self.post('draft', self.middle.published_date + datetime.timedelta(hours=1), is_published=False)
+        self.assertEqual(self.neighbours(self.middle), (self.oldest, self.newest))
+
+        draft.is_published = True
+        draft.save()
+        self.assertEqual(self.neighbours(self.middle), (self.oldest, draft))
+
+        draft.is_published = False
+        draft.save()
+        self.assertEqual(self.neighbours(self.middle), (self.oldest, self.newest))
+
+        self.oldest.published_date = timezone.now()
+        self.oldest.save()
+        self.assertEqual(self.neighbours(self.middle), (None, self.newest))
+        self.assertEqual(self.neighbours(self.oldest), (self.newest, None))
+
+    def test_query_count_does_not_depend_on_the_position(self):
+        counts = []
+        for post in (self.oldest, self.middle, self.newest):
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse('blog_detail', args=[post.slug]))
+            counts.append(len(queries))
+        self.assertEqual(len(set(counts)), 1, counts)
@@ -11,6 +11,7 @@ urlpatterns = [
     path('portfolio/<slug:slug>/', views.project_detail, name='project_detail'),
     path('products/', views.products, name='products'),
     path('gallery/', views.gallery, name='gallery'),
+    path('gallery/feed/', views.gallery_feed, name='gallery_feed'),
     path('announcements/', views.announcements, name='announcements'),
     path('announcements/<slug:slug>/', views.announcement_detail, name='announcement_detail'),
     path('blog/', views.blog, name='blog'),
@@ -18,9 +19,12 @@ urlpatterns = [
     path('testimonials/', views.testimonials, name='testimonials'),
     path('team/', views.team, name='team'),
     path('partners/', views.partners, name='partners'),
+    path('search/', views.search, name='search'),
 
     path('contact/', views.contact, name='contact'),
     path('subscribe/', views.subscribe_newsletter, name='subscribe_newsletter'),
+    path('newsletter/unsubscribe/<str:token>/', views.newsletter_unsubscribe, name='newsletter_unsubscribe'),
+    path('newsletter/resubscribe/<str:token>/', views.newsletter_resubscribe, name='newsletter_resubscribe'),
 
     # Portal
     path('portal/login/', portal_views.portal_login, name='portal_login'),
@@ -31,6 +35,7 @@ urlpatterns = [
     # Portal CRUD
     path('portal/<slug:model_name>/', portal_views.portal_list, name='portal_list'),
     path('portal/<slug:model_name>/create/', portal_views.portal_create, name='portal_create'),
+    path('portal/<slug:model_name>/autocomplete/<slug:field>/', portal_views.portal_autocomplete, name='portal_autocomplete'),
     path('portal/<slug:model_name>/<int:pk>/', portal_views.portal_detail, name='portal_detail'),
     path('portal/<slug:model_name>/<int:pk>/edit/', portal_views.portal_update, name='portal_update'),
     path('portal/<slug:model_name>/<int:pk>/delete/', portal_views.portal_delete, name='portal_delete'),
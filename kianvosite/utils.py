@@ -1,7 +1,8 @@
 import logging
-from django.core.mail import send_mail
+from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
+from .newsletter import Campaign, queue_broadcast, resubscribe_token
 
 logger = logging.getLogger(__name__)
 
@@ -13,28 +14,45 @@ def send_notification(
     from_email=None,
     html_body=None,
 ):
-    from django.conf import settings
+    """
+    Queue an email in the EmailOutbox and return straight away; `manage.py
+    send_outbox` delivers it. Returns True if the message was queued.
+    """
+    from .models import EmailOutbox
 
     if not to_emails:
         return False
 
-    from_email = from_email or settings.DEFAULT_FROM_EMAIL
-
     try:
-        send_mail(
+        EmailOutbox.objects.create(
             subject=subject,
-            message=html_body if html_body else body_text,
-            from_email=from_email,
-            recipient_list=[to_emails] if isinstance(to_emails, str) else to_emails,
-            html_message=html_body,
-            fail_silently=False,
+            body_text=body_text,
+            html_body=html_body or '',
+            from_email=from_email or '',
+            to=[to_emails] if isinstance(to_emails, str) else list(to_emails),
         )
         return True
     except Exception as e:
-        logger.error(f'Failed to send email "{subject}": {e}')
+        logger.error(f'Failed to queue email "{subject}": {e}')
         return False
 
 
+def deliver_email(message, connection=None):
+    """Send one EmailOutbox row over ``connection`` (raises on SMTP errors)."""
+    from django.conf import settings
+
+    email = EmailMultiAlternatives(
+        subject=message.subject,
+        body=message.body_text,
+        from_email=message.from_email or settings.DEFAULT_FROM_EMAIL,
+        to=message.to,
+        connection=connection,
+    )
+    if message.html_body:
+        email.attach_alternative(message.html_body, 'text/html')
+    email.send(fail_silently=False)
+
+
 def send_contact_notification(inquiry):
     subject = f'[KianvoSoft Contact] {inquiry.subject or "New Inquiry"} - {inquiry.name}'
     body = f"""
@@ -95,16 +113,15 @@ View in portal: http://localhost:8000/portal/blogposts/
     return send_notification(subject, body, 'info@kianvosoft.com')
 
 
-def send_blog_to_subscribers(post):
+def blog_newsletter(post):
+    """The subscriber Campaign for ``post``."""
     from django.conf import settings
-    from .models import NewsletterSubscriber
-    subscribers = NewsletterSubscriber.objects.filter(is_active=True).values_list('email', flat=True)
-    if not subscribers:
-        return False
+    personal = Campaign.placeholders()
     subject = f'New Blog Post: {post.title}'
     html_body = render_to_string('emails/blog_subscriber.html', {
         'post': post,
         'site_url': settings.SITE_URL,
+        **personal,
     })
     body = f"""
 KianvoSoft has published a new blog post!
@@ -116,8 +133,15 @@ Author: {post.author or 'KianvoSoft'}
 {post.excerpt or ''}
 
 Read the full post at: {settings.SITE_URL}/blog/{post.slug}/
+
+Unsubscribe: {personal['unsubscribe_url']}
     """.strip()
-    return send_notification(subject, body, list(subscribers), html_body=html_body)
+    return Campaign(subject, body, html_body)
+
+
+def send_blog_to_subscribers(post):
+    """Queue ``post`` for every active subscriber; `manage.py send_broadcasts` sends it."""
+    return queue_broadcast(post)
 
 
 def send_new_announcement_notification(announcement):
@@ -138,16 +162,15 @@ View in portal: http://localhost:8000/portal/announcements/
     return send_notification(subject, body, 'info@kianvosoft.com')
 
 
-def send_announcement_to_subscribers(announcement):
+def announcement_newsletter(announcement):
+    """The subscriber Campaign for ``announcement``."""
     from django.conf import settings
-    from .models import NewsletterSubscriber
-    subscribers = NewsletterSubscriber.objects.filter(is_active=True).values_list('email', flat=True)
-    if not subscribers:
-        return False
+    personal = Campaign.placeholders()
     subject = f'New Opportunity: {announcement.title}'
     html_body = render_to_string('emails/announcement_subscriber.html', {
         'announcement': announcement,
         'site_url': settings.SITE_URL,
+        **personal,
     })
     body = f"""
 KianvoSoft has opened a new opportunity!
@@ -159,5 +182,28 @@ Deadline: {announcement.application_deadline.strftime('%Y-%m-%d') if hasattr(ann
 {announcement.short_description or ''}
 
 Apply now at: {settings.SITE_URL}/announcements/{announcement.slug}/
+
+Unsubscribe: {personal['unsubscribe_url']}
+    """.strip()
+    return Campaign(subject, body, html_body)
+
+
+def send_announcement_to_subscribers(announcement):
+    """Queue ``announcement`` for every active subscriber; `manage.py send_broadcasts` sends it."""
+    return queue_broadcast(announcement)
+
+
+def send_resubscribe_confirmation(email):
+    """Mail ``email`` a link that turns its lapsed subscription back on."""
+    from django.conf import settings
+    from django.urls import reverse
+    subject = 'Confirm your KianvoSoft newsletter subscription'
+    body = f"""
+Someone asked to subscribe {email} to the KianvoSoft newsletter again.
+
+To start receiving new blog posts and opportunities, confirm here:
+{settings.SITE_URL}{reverse('newsletter_resubscribe', args=[resubscribe_token(email)])}
+
+If this was not you, ignore this email and nothing will change.
     """.strip()
-    return send_notification(subject, body, list(subscribers), html_body=html_body)
+    return send_notification(subject, body, email)
@@ -1,7 +1,9 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
-from django.http import JsonResponse
-from django.utils import timezone
+from django.http import JsonResponse, Http404
+from django.views.decorators.csrf import csrf_exempt
+from django.core.cache import cache
+from django.utils import timezone, dateformat
 from .models import (
     ProjectCategory, Project, Service, Testimonial,
     BlogCategory, BlogPost, ContactInquiry,
@@ -10,13 +12,25 @@ from .models import (
     GalleryCategory, GalleryImage, Announcement,
     AnnouncementApplication, HeroSlide, ActiveProduct
 )
-from .utils import send_contact_notification, send_application_notification
+from .caching import bump_version, cached_section, cached_sections, cache_anonymous_page, conditional_page
+from .images import prefetch_derivatives, srcsets
+from .newsletter import resubscribe_email, unsubscribe_email
+from .pagination import keyset_page
+from . import site_search
+from .utils import send_contact_notification, send_application_notification, send_resubscribe_confirmation
+
+# Keyset orderings for the paginated list pages (Meta.ordering plus '-id' so
+# every row has a unique position for the ?after= cursor).
+BLOG_ORDERING = ['-published_date', '-id']
+PORTFOLIO_ORDERING = ['-is_featured', 'order', '-created_at', '-id']
+GALLERY_ORDERING = ['-is_featured', 'order', '-event_date', '-id']
+PAGE_SIZE = 12
 
 
 def _resolve_active_products():
     """Return active products with project resolved by FK first, then by name match."""
     products = list(ActiveProduct.objects.filter(is_active=True).select_related('project'))
-    all_projects = {p.name.lower(): p for p in Project.objects.filter(is_active=True)}
+    all_projects = {p.name.lower(): p for p in Project.objects.for_cards().filter(is_active=True)}
     for product in products:
         if not product.project:
             product.project = all_projects.get(product.name.lower())
@@ -24,62 +38,81 @@ def _resolve_active_products():
 
 
 # Home Page
+@conditional_page
+@cache_anonymous_page
 def home(request):
-    context = {
-        'featured_projects': Project.objects.filter(is_active=True, is_featured=True)[:6],
-        'services': Service.objects.filter(is_active=True, service_type='current')[:4],
-        'future_visions': Service.objects.filter(is_active=True, service_type='future')[:3],
-
-        'testimonials': Testimonial.objects.filter(is_active=True, is_featured=True)[:3],
-        'blog_posts': BlogPost.objects.filter(is_published=True)[:3],
-        'partners': Partner.objects.filter(is_active=True),
-        'stats': CompanyStat.objects.filter(is_active=True),
-        'team_members': TeamMember.objects.filter(is_active=True),
-        'hero_slides': HeroSlide.objects.filter(is_active=True),
-        'active_products': _resolve_active_products(),
-        'open_announcements': Announcement.objects.filter(is_active=True, status='open'),
-    }
+    context = cached_sections('home', {
+        'featured_projects': ((Project,), lambda: list(Project.objects.for_cards().filter(is_active=True, is_featured=True)[:6])),
+        'services': ((Service,), lambda: list(Service.objects.for_cards().filter(is_active=True, service_type='current')[:4])),
+        'future_visions': ((Service,), lambda: list(Service.objects.for_cards().filter(is_active=True, service_type='future')[:3])),
+
+        'testimonials': ((Testimonial,), lambda: list(Testimonial.objects.filter(is_active=True, is_featured=True)[:3])),
+        'blog_posts': ((BlogPost,), lambda: list(BlogPost.objects.for_cards().filter(is_published=True)[:3])),
+        'partners': ((Partner,), lambda: list(Partner.objects.filter(is_active=True))),
+        'stats': ((CompanyStat,), lambda: list(CompanyStat.objects.filter(is_active=True))),
+        'team_members': ((TeamMember,), lambda: list(TeamMember.objects.filter(is_active=True))),
+        'hero_slides': ((HeroSlide,), lambda: list(HeroSlide.objects.filter(is_active=True))),
+        'active_products': ((ActiveProduct, Project), _resolve_active_products),
+        'open_announcements': ((Announcement,), lambda: list(Announcement.objects.for_cards().filter(is_active=True, status='open'))),
+    })
+    prefetch_derivatives(request, [member.image for member in context['team_members']])
     return render(request, 'index.html', context)
 
 
 # About Page
+@conditional_page
+@cache_anonymous_page
 def about(request):
     context = {
         'stats': CompanyStat.objects.filter(is_active=True),
         'testimonials': Testimonial.objects.filter(is_active=True)[:4],
-        'team_members': TeamMember.objects.filter(is_active=True),
+        'team_members': list(TeamMember.objects.filter(is_active=True)),
     }
+    prefetch_derivatives(request, [member.image for member in context['team_members']])
     return render(request, 'about.html', context)
 
 
 # Products Showcase Page (animated carousel, demo credentials)
+@conditional_page
+@cache_anonymous_page
 def products(request):
     context = {
-        'projects': Project.objects.filter(is_active=True),
+        'projects': list(Project.objects.for_showcase().filter(is_active=True)),
         'categories': ProjectCategory.objects.filter(is_active=True),
-        'featured_screenshots': ProductImage.objects.filter(is_featured=True)[:12],
+        'featured_screenshots': list(ProductImage.objects.for_listing().filter(is_featured=True)[:12]),
     }
+    prefetch_derivatives(request, [
+        *(shot.image for shot in context['featured_screenshots']),
+        *(shot.image for project in context['projects'] for shot in project.screenshots.all()[:4]),
+    ])
     return render(request, 'products.html', context)
 
 
 # Testimonials Page
+@conditional_page
+@cache_anonymous_page
 def testimonials(request):
     context = {
-        'testimonials': Testimonial.objects.filter(is_active=True),
+        'testimonials': Testimonial.objects.for_listing().filter(is_active=True),
         'stats': CompanyStat.objects.filter(is_active=True),
     }
     return render(request, 'testimonials.html', context)
 
 
 # Team Page
+@conditional_page
+@cache_anonymous_page
 def team(request):
     context = {
-        'team_members': TeamMember.objects.filter(is_active=True),
+        'team_members': list(TeamMember.objects.filter(is_active=True)),
     }
+    prefetch_derivatives(request, [member.image for member in context['team_members']])
     return render(request, 'team.html', context)
 
 
 # Partners Page
+@conditional_page
+@cache_anonymous_page
 def partners(request):
     context = {
         'partners': Partner.objects.filter(is_active=True),
@@ -89,27 +122,61 @@ def partners(request):
 
 
 # Gallery Page (past classes, bootcamps, trainings)
+@conditional_page
+@cache_anonymous_page(params=('category', 'after'))
 def gallery(request):
     category_slug = request.GET.get('category', None)
-    images = GalleryImage.objects.filter(is_active=True)
+    images = GalleryImage.objects.for_listing().filter(is_active=True)
     categories = GalleryCategory.objects.filter(is_active=True)
 
     if category_slug:
         images = images.filter(category__slug=category_slug)
 
+    page = keyset_page(images, GALLERY_ORDERING, request.GET.get('after'), PAGE_SIZE)
+    prefetch_derivatives(request, [image.image for image in page.items])
     context = {
-        'images': images,
+        'images': page.items,
+        'next_cursor': page.next_cursor,
         'categories': categories,
         'current_category': category_slug,
     }
     return render(request, 'gallery.html', context)
 
 
+# Gallery infinite-scroll feed (JSON, same ?category= / ?after= parameters)
+@conditional_page
+@cache_anonymous_page(params=('category', 'after'))
+def gallery_feed(request):
+    images = GalleryImage.objects.for_listing().filter(is_active=True)
+    category_slug = request.GET.get('category')
+    if category_slug:
+        images = images.filter(category__slug=category_slug)
+
+    page = keyset_page(images, GALLERY_ORDERING, request.GET.get('after'), PAGE_SIZE)
+    derivatives = prefetch_derivatives(request, [image.image for image in page.items])
+    cards = []
+    for image in page.items:
+        # Same srcsets as {% responsive_image %}; empty until the image is processed
+        entry = derivatives.get(image.image.name)
+        webp_srcset, srcset = srcsets(image.image, entry) if entry else ('', '')
+        cards.append({
+            'title': image.title,
+            'url': image.image.url,
+            'webp_srcset': webp_srcset,
+            'srcset': srcset,
+            'description': image.description,
+            'category': image.category.name if image.category else '',
+            'event_date': dateformat.format(image.event_date, 'F j, Y') if image.event_date else '',
+        })
+    return JsonResponse({'images': cards, 'next': page.next_cursor})
+
+
 # Announcements Page
+@conditional_page
 def announcements(request):
     context = {
-        'announcements': Announcement.objects.filter(is_active=True, status__in=['open', 'closed']),
-        'open_announcements': Announcement.objects.filter(is_active=True, status='open'),
+        'announcements': Announcement.objects.for_cards().filter(is_active=True, status__in=['open', 'closed']),
+        'open_announcements': Announcement.objects.for_cards().filter(is_active=True, status='open'),
     }
     return render(request, 'announcements.html', context)
 
@@ -180,7 +247,7 @@ def announcement_detail(request, slug):
         'announcement': announcement,
         'extra_fields': extra_form_fields,
         'already_applied': already_applied,
-        'related_announcements': Announcement.objects.filter(
+        'related_announcements': Announcement.objects.for_cards().filter(
             is_active=True, announcement_type=announcement.announcement_type
         ).exclude(id=announcement.id)[:3],
     }
@@ -188,26 +255,32 @@ def announcement_detail(request, slug):
 
 
 # Services Page
+@conditional_page
+@cache_anonymous_page
 def services(request):
     context = {
-        'current_services': Service.objects.filter(is_active=True, service_type='current'),
-        'future_visions': Service.objects.filter(is_active=True, service_type='future'),
+        'current_services': Service.objects.for_cards().filter(is_active=True, service_type='current'),
+        'future_visions': Service.objects.for_cards().filter(is_active=True, service_type='future'),
     }
     return render(request, 'service.html', context)
 
 
 # Portfolio Page - Display all projects
+@conditional_page
+@cache_anonymous_page(params=('category', 'after'))
 def portfolio(request):
     category_slug = request.GET.get('category', None)
 
-    projects = Project.objects.filter(is_active=True)
+    projects = Project.objects.for_cards().filter(is_active=True)
     categories = ProjectCategory.objects.filter(is_active=True)
 
     if category_slug:
         projects = projects.filter(category__slug=category_slug)
 
+    page = keyset_page(projects, PORTFOLIO_ORDERING, request.GET.get('after'), PAGE_SIZE)
     context = {
-        'projects': projects,
+        'projects': page.items,
+        'next_cursor': page.next_cursor,
         'categories': categories,
         'current_category': category_slug,
         'stats': CompanyStat.objects.filter(is_active=True),
@@ -216,9 +289,11 @@ def portfolio(request):
 
 
 # Project Detail Page
+@conditional_page
+@cache_anonymous_page
 def project_detail(request, slug):
-    project = get_object_or_404(Project, slug=slug, is_active=True)
-    related_projects = Project.objects.filter(
+    project = get_object_or_404(Project.objects.for_listing(), slug=slug, is_active=True)
+    related_projects = Project.objects.for_cards().filter(
         is_active=True,
         category=project.category
     ).exclude(id=project.id)[:3]
@@ -231,56 +306,61 @@ def project_detail(request, slug):
 
 
 # Blog Page
+@conditional_page
+@cache_anonymous_page(params=('category', 'after'))
 def blog(request):
     category_slug = request.GET.get('category', None)
 
-    posts = BlogPost.objects.filter(is_published=True)
+    posts = BlogPost.objects.for_cards().filter(is_published=True)
     categories = BlogCategory.objects.filter(is_active=True)
 
     if category_slug:
         posts = posts.filter(category__slug=category_slug)
 
+    page = keyset_page(posts, BLOG_ORDERING, request.GET.get('after'), PAGE_SIZE)
+    prefetch_derivatives(request, [post.featured_image for post in page.items])
     context = {
-        'posts': posts,
+        'posts': page.items,
+        'next_cursor': page.next_cursor,
         'categories': categories,
         'current_category': category_slug,
-        'featured_posts': BlogPost.objects.filter(is_published=True, is_featured=True)[:3],
+        'featured_posts': BlogPost.objects.for_cards().filter(is_published=True, is_featured=True)[:3],
     }
     return render(request, 'blog.html', context)
 
 
+def _published_post_order():
+    """
+    [(id, category_id), ...] for every published post, newest first. Cached
+    until a post is saved or deleted, which covers publishing, unpublishing
+    and re-dating.
+    """
+    return cached_section('blog', 'order', (BlogPost,), lambda: list(
+        BlogPost.objects.filter(is_published=True).order_by(*BLOG_ORDERING).values_list('id', 'category_id')
+    ))
+
+
 # Blog Post Detail
+@conditional_page
+@cache_anonymous_page
 def blog_detail(request, slug):
-    post = get_object_or_404(BlogPost, slug=slug, is_published=True)
-    related_posts = BlogPost.objects.filter(
-        is_published=True,
-        category=post.category
-    ).exclude(id=post.id)[:3]
-
-    # Prev / Next navigation
-    prev_post = BlogPost.objects.filter(
-        is_published=True,
-        published_date__lt=post.published_date
-    ).order_by('-published_date').first()
-
-    next_post = BlogPost.objects.filter(
-        is_published=True,
-        published_date__gt=post.published_date
-    ).order_by('published_date').first()
-
-    # Estimate reading time (avg 200 words/min)
-    import re
-    plain_text = re.sub(r'<[^>]+>', '', str(post.content))
-    word_count = len(plain_text.split())
-    reading_time = max(1, round(word_count / 200))
+    post = get_object_or_404(BlogPost.objects.for_listing(), slug=slug, is_published=True)
+
+    # Prev / next / related come from the cached order, then one query loads them
+    order = _published_post_order()
+    ids = [pk for pk, _ in order]
+    position = ids.index(post.id) if post.id in ids else None
+    newer_id = ids[position - 1] if position else None
+    older_id = ids[position + 1] if position is not None and position + 1 < len(ids) else None
+    related_ids = [pk for pk, category_id in order if category_id == post.category_id and pk != post.id][:3]
+    posts = BlogPost.objects.for_cards().in_bulk([*related_ids, *filter(None, [newer_id, older_id])])
+    prefetch_derivatives(request, [post.featured_image, *(posts[pk].featured_image for pk in related_ids if pk in posts)])
 
     context = {
         'post': post,
-        'related_posts': related_posts,
-        'prev_post': prev_post,
-        'next_post': next_post,
-        'reading_time': reading_time,
-        'word_count': word_count,
+        'related_posts': [posts[pk] for pk in related_ids if pk in posts],
+        'prev_post': posts.get(older_id),
+        'next_post': posts.get(newer_id),
     }
     return render(request, 'blog_detail.html', context)
 
@@ -318,6 +398,11 @@ def contact(request):
 
 
 # Newsletter Subscription (AJAX)
+# No CSRF token: the form sits on cached pages, and subscribing an address
+# is something anyone can already do from the form itself. An address that
+# unsubscribed or bounced is only turned back on from a link mailed to it, so
+# a third party cannot resubscribe it.
+@csrf_exempt
 def subscribe_newsletter(request):
     if request.method == 'POST':
         email = request.POST.get('email', '')
@@ -333,6 +418,15 @@ def subscribe_newsletter(request):
                     'success': True,
                     'message': 'Thank you for subscribing to our newsletter!'
                 })
+            elif not subscriber.is_active:
+                # At most one confirmation per address per hour, so the form
+                # cannot be used to flood someone's inbox
+                if cache.add(f'kv:resubscribe:{email.lower()}', True, 60 * 60):
+                    send_resubscribe_confirmation(subscriber.email)
+                return JsonResponse({
+                    'success': True,
+                    'message': 'Please check your inbox to confirm your subscription.'
+                })
             else:
                 return JsonResponse({
                     'success': False,
@@ -347,10 +441,69 @@ def subscribe_newsletter(request):
     return JsonResponse({'success': False, 'message': 'Invalid request method.'})
 
 
+# Newsletter Resubscribe
+# Linked from the confirmation subscribe_newsletter mails to a lapsed
+# address. Like unsubscribing, it takes a POST, so link scanners that fetch
+# the URL do not confirm it.
+@csrf_exempt
+def newsletter_resubscribe(request, token):
+    email = resubscribe_email(token)
+    if email is None:
+        raise Http404('Invalid or expired confirmation link')
+
+    if request.method == 'POST':
+        NewsletterSubscriber.objects.filter(email__iexact=email).update(is_active=True)
+        # update() sends no post_save, so invalidate the subscriber counts by hand
+        bump_version(NewsletterSubscriber)
+
+    context = {
+        'email': email,
+        'resubscribed': request.method == 'POST',
+    }
+    return render(request, 'newsletter_resubscribe.html', context)
+
+
+# Newsletter Unsubscribe
+# Linked from every newsletter; the signed token identifies the address, so
+# the POST needs no CSRF token and mail clients can use one-click
+# List-Unsubscribe.
+@csrf_exempt
+def newsletter_unsubscribe(request, token):
+    email = unsubscribe_email(token)
+    if email is None:
+        raise Http404('Invalid unsubscribe link')
+
+    if request.method == 'POST':
+        NewsletterSubscriber.objects.filter(email__iexact=email).update(is_active=False)
+        # update() sends no post_save, so invalidate the subscriber counts by hand
+        bump_version(NewsletterSubscriber)
+
+    context = {
+        'email': email,
+        'unsubscribed': request.method == 'POST',
+    }
+    return render(request, 'newsletter_unsubscribe.html', context)
+
+
+# Site Search
+# Not page-cached: each query string is a different page, and one FTS query
+# is cheaper than filling the cache with them.
+@conditional_page
+def search(request):
+    query = request.GET.get('q', '').strip()[:200]
+    context = {
+        'query': query,
+        'results': site_search.search(query) if query else [],
+    }
+    return render(request, 'search.html', context)
+
+
 # Service Detail Page
+@conditional_page
+@cache_anonymous_page
 def service_detail(request, slug):
     service = get_object_or_404(Service, slug=slug, is_active=True)
-    related_projects = Project.objects.filter(is_active=True)[:4]
+    related_projects = Project.objects.for_cards().filter(is_active=True)[:4]
 
     context = {
         'service': service,
@@ -110,6 +110,38 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# Passenger runs several worker processes, so production needs a cache they
+# all share: a file-system cache next to the project (override the location
+# with DJANGO_CACHE_DIR). Development keeps a per-process in-memory cache.
+# After a deploy, run: python manage.py warm_cache
+#
+# RELEASE identifies the deployed code and is part of every cached page's key
+# and validators. Set DJANGO_RELEASE (e.g. to the git commit) in the deploy;
+# left empty, it is derived from the modification times of the templates,
+# app source and static manifest.
+RELEASE = os.environ.get('DJANGO_RELEASE', '')
+
+if IS_PRODUCTION:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('DJANGO_CACHE_DIR', str(BASE_DIR / 'cache')),
+            'TIMEOUT': 60 * 60 * 24,
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'kianvosoft-dev',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -155,6 +187,17 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# /media/ is served by kianvosite.media_views.serve_media. When the front
+# server can send files itself, hand them off instead of streaming through a
+# Passenger worker: set DJANGO_MEDIA_SENDFILE to 'X-Sendfile' (Apache
+# mod_xsendfile) or 'X-Accel-Redirect' (nginx; MEDIA_ACCEL_PREFIX must be an
+# `internal` location aliased to MEDIA_ROOT).
+MEDIA_SENDFILE = os.environ.get('DJANGO_MEDIA_SENDFILE', '')
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+# Browser cache lifetime for originals, which can be replaced in place.
+# Content-hashed derivatives are always cached for a year.
+MEDIA_MAX_AGE = 60 * 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -165,6 +208,14 @@ LOGIN_URL = '/portal/login/'
 LOGIN_REDIRECT_URL = '/portal/dashboard/'
 LOGOUT_REDIRECT_URL = '/portal/login/'
 
+# Portal list filters on a foreign key show a dropdown up to this many rows,
+# and an autocomplete box beyond it.
+PORTAL_FILTER_CHOICE_LIMIT = 200
+
+# Unfiltered portal lists of tables larger than this show an estimated row
+# count, with a link to count exactly.
+PORTAL_ESTIMATE_COUNT_ABOVE = 50000
+
 SILENCED_SYSTEM_CHECKS = ['ckeditor.W001']
 
 SITE_URL = 'https://kianvosoft.com'
@@ -181,6 +232,16 @@ EMAIL_HOST_USER = 'info@kianvosoft.com'
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', 'Kianvo@2026')
 DEFAULT_FROM_EMAIL = 'KianvoSoft <info@kianvosoft.com>'
 SERVER_EMAIL = 'info@kianvosoft.com'
+
+# Newsletter fan-out (kianvosite/newsletter.py): messages per SMTP connection,
+# the most messages per second to send (0 = no limit), and retries of a
+# temporary (4xx / dropped connection) failure per recipient.
+NEWSLETTER_BATCH_SIZE = 100
+NEWSLETTER_RATE = 50
+NEWSLETTER_RETRIES = 2
+# Maildir that receives bounces for DEFAULT_FROM_EMAIL (see process_bounces)
+BOUNCE_MAILDIR = os.environ.get('DJANGO_BOUNCE_MAILDIR', '')
+
 ADMINS = [('Admin', 'admin@kianvosoft.com')]
 
 # CKEditor Configuration
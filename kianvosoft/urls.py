@@ -19,9 +19,9 @@ from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib.sitemaps.views import sitemap
-from django.views.static import serve
 from django.http import HttpResponse
 from kianvosite.sitemaps import sitemaps
+from kianvosite.media_views import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -32,7 +32,7 @@ urlpatterns = [
         content_type='text/plain'
     )),
     # Serve uploaded media files in both dev and production
-    re_path(r'^media/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),
+    re_path(r'^media/(?P<path>.*)$', serve_media),
     path('', include('kianvosite.urls')),
 ]
 